@@ -0,0 +1,263 @@
+# coding: utf8
+# Copyright (c) Marnik Bercx, University of Antwerp
+# Distributed under the terms of the MIT License
+
+import hashlib
+import os
+import pickle
+import platform
+import tempfile
+
+import numpy
+import scipy
+
+try:
+    from importlib.metadata import version as _get_distribution_version
+except ImportError:  # Python < 3.8
+    import pkg_resources
+
+    def _get_distribution_version(name):
+        return pkg_resources.get_distribution(name).version
+
+"""
+Persistent cache for storing the results of expensive structure analysis, e.g.
+voronoi decompositions and symmetry analysis, so they can be reused across
+processes.
+
+The cache directory can be set with the PYBAT_CACHE_DIR environment variable,
+and its maximum size (in MB) with PYBAT_CACHE_SIZE. Setting PYBAT_CACHE_DIR to
+an empty string disables the cache. Because the results are stored as pickles,
+the cache directory should only be writable by the user.
+
+"""
+
+__author__ = "Marnik Bercx"
+__copyright__ = "Copyright 2019, Marnik Bercx, University of Antwerp"
+__version__ = "pre-alpha"
+__maintainer__ = "Marnik Bercx"
+__email__ = "marnik.bercx@uantwerpen.be"
+__date__ = "Apr 2019"
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".pybat_cache")
+
+# Default maximum size of the cache directory, in MB
+DEFAULT_CACHE_SIZE = 1000
+
+CACHE_EXTENSION = ".pickle"
+
+# Number of entries written between two scans of the cache directory, so the
+# size of the cache is also checked in case other processes write to it
+EVICTION_INTERVAL = 100
+
+
+def _get_library_versions():
+    """
+    Versions of python and the libraries whose objects are stored in the cache,
+    so pickles written by other versions are never loaded.
+
+    """
+    versions = [platform.python_version(), numpy.__version__,
+                scipy.__version__]
+
+    for name in ("pybat", "pymatgen"):
+        try:
+            versions.append(_get_distribution_version(name))
+        except Exception:
+            versions.append(None)
+
+    return tuple(versions)
+
+
+LIBRARY_VERSIONS = _get_library_versions()
+
+
+class DiskCache(object):
+    """
+    Content-addressed cache directory, in which every entry is stored in a
+    file named after its key. When the total size of the cache exceeds the
+    maximum, the least recently used entries are removed.
+
+    """
+
+    def __init__(self, directory=None, max_size=None):
+        """
+        Initialize the cache.
+
+        Args:
+            directory (str): Path to the cache directory. Defaults to the
+                PYBAT_CACHE_DIR environment variable, or ~/.pybat_cache.
+                An empty string disables the cache.
+            max_size (float): Maximum size of the cache directory in MB.
+                Defaults to the PYBAT_CACHE_SIZE environment variable, or
+                DEFAULT_CACHE_SIZE.
+
+        """
+        if directory is None:
+            directory = os.environ.get("PYBAT_CACHE_DIR", DEFAULT_CACHE_DIR)
+        if max_size is None:
+            max_size = float(os.environ.get("PYBAT_CACHE_SIZE",
+                                            DEFAULT_CACHE_SIZE))
+
+        self._directory = os.path.expanduser(directory)
+        self._max_size = int(max_size * 1024 ** 2)
+
+        # Size of the cache directory, as determined by the last scan and the
+        # entries written since. None means the cache has not been scanned yet.
+        self._size = None
+        self._writes_since_eviction = 0
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def enabled(self):
+        return self._directory != ""
+
+    @staticmethod
+    def make_key(*parts):
+        """
+        Construct a cache key from a set of parts, e.g. the kind of data, the
+        fingerprint of the structure and the tolerances used. The versions of
+        the libraries are included in the key as well.
+
+        Returns:
+            (str): Hexadecimal digest of the parts.
+
+        """
+        return hashlib.sha1(
+            repr((LIBRARY_VERSIONS,) + parts).encode("utf8")
+        ).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self._directory, key[:2], key + CACHE_EXTENSION)
+
+    def get(self, key):
+        """
+        Load an entry from the cache.
+
+        Args:
+            key (str): Key of the entry.
+
+        Returns:
+            The cached data, or None if the entry is not found.
+
+        """
+        if not self.enabled:
+            return None
+
+        path = self._path(key)
+
+        try:
+            with open(path, "rb") as file:
+                data = pickle.load(file)
+        except OSError:
+            return None
+        except Exception:
+            # Entries which can not be unpickled, e.g. because they were
+            # written by other versions of the libraries, are removed
+            self._remove(path)
+            return None
+
+        try:
+            # Mark the entry as recently used
+            os.utime(path)
+        except OSError:
+            pass
+
+        return data
+
+    def set(self, key, data):
+        """
+        Store an entry in the cache. The entry is first written to a temporary
+        file, so other processes never read a partially written entry.
+
+        Args:
+            key (str): Key of the entry.
+            data: Data to store, which must be picklable.
+
+        """
+        if not self.enabled:
+            return
+
+        path = self._path(key)
+        temp_path = None
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            (handle, temp_path) = tempfile.mkstemp(
+                dir=os.path.dirname(path), suffix=".tmp"
+            )
+            with os.fdopen(handle, "wb") as file:
+                pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+            temp_path = None
+            size = os.path.getsize(path)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError):
+            return
+        finally:
+            if temp_path is not None:
+                self._remove(temp_path)
+
+        # Only scan the cache directory in case it might be too large, or after
+        # a number of writes
+        self._writes_since_eviction += 1
+        if self._size is not None:
+            self._size += size
+
+        if self._size is None or self._size > self._max_size \
+                or self._writes_since_eviction >= EVICTION_INTERVAL:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache is smaller than
+        its maximum size.
+
+        """
+        self._writes_since_eviction = 0
+
+        entries = []
+
+        for root, _, files in os.walk(self._directory):
+            for filename in files:
+                if filename.endswith(CACHE_EXTENSION):
+                    path = os.path.join(root, filename)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(entry[1] for entry in entries)
+
+        for (_, size, path) in sorted(entries):
+            if total_size <= self._max_size:
+                break
+            self._remove(path)
+            total_size -= size
+
+        self._size = total_size
+
+    def clear(self):
+        """
+        Remove all entries from the cache.
+
+        """
+        for root, _, files in os.walk(self._directory):
+            for filename in files:
+                if filename.endswith(CACHE_EXTENSION):
+                    self._remove(os.path.join(root, filename))
+
+        self._size = 0
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# Cache shared by all pybat analysis methods
+disk_cache = DiskCache()
@@ -606,8 +606,16 @@ def relax(structure_file, functional, directory, is_metal, in_custodian, number_
               help="Directory in which to set up the configuration workflow.")
 @click.option("--in_custodian", "-c", is_flag=True, help=IN_CUSTODIAN_HELP)
 @click.option("--number_nodes", "-n", default=0, help=NUMBER_NODES_HELP)
+@click.option("--processes", "-p", default=None, type=int,
+              help="Number of processes over which the enumeration of the "
+                   "configurations is distributed.")
+@click.option("--checkpoint", "-C", default=None,
+              help="Directory in which the enumerated configurations are stored, "
+                   "together with a checkpoint of the enumeration. Rerunning the "
+                   "command with the same directory resumes the enumeration.")
 def configuration(structure_file, functional, sub_sites, element_list, sizes,
-                  directory, conc_restrict, max_conf, in_custodian, number_nodes):
+                  directory, conc_restrict, max_conf, in_custodian, number_nodes,
+                  processes, checkpoint):
     """
     Set up a geometry optimization workflow for a range of configurations.
     """
@@ -635,7 +643,9 @@ def configuration(structure_file, functional, sub_sites, element_list, sizes,
                            functional=string_to_functional(functional),
                            directory=directory,
                            in_custodian=in_custodian,
-                           number_nodes=number_nodes)
+                           number_nodes=number_nodes,
+                           processes=processes,
+                           checkpoint_directory=checkpoint)
 
 
 @workflow.command(context_settings=CONTEXT_SETTINGS)
@@ -7,7 +7,6 @@ import os
 from monty.io import zopen
 from pymatgen.io.vasp.outputs import Vasprun
 from pymatgen.analysis.transition_state import NEBAnalysis
-from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
 
 from pybat.core import Cathode
 
@@ -55,7 +54,7 @@ def conventional_structure(structure_file, fmt="json"):
 
     """
     cathode = Cathode.from_file(structure_file)
-    spg = SpacegroupAnalyzer(cathode)
+    spg = cathode.get_symmetry_context().analyzer
 
     conv_structure_file = structure_file.split(".")[0] + "_conv" + "." + fmt
     spg.get_conventional_standard_structure().to(fmt, conv_structure_file)
@@ -72,7 +71,7 @@ def primitive_structure(structure_file, fmt="json"):
 
     """
     cathode = Cathode.from_file(structure_file)
-    spg = SpacegroupAnalyzer(cathode)
+    spg = cathode.get_symmetry_context().analyzer
 
     prim_structure_file = structure_file.split(".")[0] + "_conv" + "." + fmt
     spg.get_primitive_standard_structure().to(fmt, prim_structure_file)
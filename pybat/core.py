@@ -2,26 +2,36 @@
 # Copyright (c) Marnik Bercx, University of Antwerp
 # Distributed under the terms of the MIT License
 
-import itertools
+import collections
+import hashlib
 import math
 import json
 import os
 import pdb
+import warnings
 
 import numpy as np
 
 from monty.io import zopen
 from monty.json import jsanitize, MSONable
-from pymatgen.core import Structure, Composition, Molecule, Site, Element
+from pymatgen.core import Structure, Composition, Element, Molecule, Site, \
+    PeriodicSite
 from pymatgen.analysis.chemenv.coordination_environments.voronoi \
     import DetailedVoronoiContainer
 from pymatgen.io.vasp.outputs import Outcar
 from pymatgen.io.ase import AseAtomsAdaptor
-from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
 from pymatgen.analysis.transition_state import NEBAnalysis
 from pymatgen.util.plotting import pretty_plot
+from ase.data import atomic_numbers, chemical_symbols
 from tabulate import tabulate
-from icet.tools.structure_enumeration import enumerate_structures
+
+from pybat.cache import disk_cache
+from pybat.enumeration import EnumerationCheckpoint, enumerate_structures
+from pybat.neighbors import PeriodicSiteIndex, VoronoiNeighborTable, \
+    NeighborGraph, SITE_MATCHING_TOL, find_cutoff_neighbors, \
+    get_minimum_image_vectors
+from pybat.symmetry import SymmetryContext, DEFAULT_SYMPREC, \
+    DEFAULT_ANGLE_TOLERANCE
 
 scipy_old_piecewisepolynomial = True
 try:
@@ -53,11 +63,27 @@ __date__ = "May 2018"
 VORONOI_DIST_FACTOR = 1.4
 VORONOI_ANG_FACTOR = 0.6
 
+# Default cutoff distance (in Angstrom) between cations and anions for the
+# "cutoff" neighbor backend.
+DEFAULT_NEIGHBOR_CUTOFF = 2.5
+
 # Tolerance for the representation determination. This can be pretty big, since
 # the dimer environment structure is known.
 REPRESENTATION_DIST_TOL = 5e-1
 REPRESENTATION_ANGLE_TOL = 2e-1
 
+# Tolerance for the coordinates (fractional) and lattice vectors (Angstrom) used
+# to determine the fingerprint of a structure.
+FINGERPRINT_TOL = 1e-3
+
+# Number of decimals of the magnetic moments used in the disk cache key of the
+# symmetry context.
+MAGMOM_DECIMALS = 3
+
+# Number of configurations that are stored in each file of a checkpointed
+# configuration enumeration
+CHECKPOINT_CHUNK_SIZE = 100
+
 # Dimer representation symmetry permutations
 SYMMETRY_PERMUTATIONS = [[1, 2, 4, 3, 6, 5, 8, 7, 9, 10, 11, 12],
                          [2, 1, 3, 4, 7, 8, 5, 6, 11, 12, 9, 10],
@@ -69,6 +95,69 @@ SYMMETRY_PERMUTATIONS = [[1, 2, 4, 3, 6, 5, 8, 7, 9, 10, 11, 12],
                          [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12]]
 
 
+class GeometryRegistry(object):
+    """
+    Registry of data that only depends on the geometry of a structure, which
+    allows sharing this data between Cathodes that only differ in the
+    occupation of their sites. Only the most recently used entries are kept.
+
+    """
+
+    def __init__(self, maxsize=16):
+        """
+        Initialize the registry.
+
+        Args:
+            maxsize (int): Maximum number of entries kept in the registry.
+
+        """
+        self._maxsize = maxsize
+        self._entries = collections.OrderedDict()
+
+    def get(self, name, geometry_key):
+        """
+        Get an entry from the registry.
+
+        Args:
+            name (str): Name of the data, e.g. "voronoi".
+            geometry_key (str): Geometry key of the structure.
+
+        Returns:
+            The registered data, or None if it is not found.
+
+        """
+        try:
+            self._entries.move_to_end((name, geometry_key))
+        except KeyError:
+            return None
+
+        return self._entries[(name, geometry_key)]
+
+    def add(self, name, geometry_key, data):
+        """
+        Add an entry to the registry, removing the least recently used entry in
+        case the registry is full.
+
+        Args:
+            name (str): Name of the data, e.g. "voronoi".
+            geometry_key (str): Geometry key of the structure.
+            data: Data to register.
+
+        """
+        self._entries[(name, geometry_key)] = data
+        self._entries.move_to_end((name, geometry_key))
+
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+# Registry of the geometry data shared between all Cathodes
+geometry_registry = GeometryRegistry()
+
+
 class Cathode(Structure):
     """
     A class representing a cathode material in a battery.
@@ -96,6 +185,21 @@ class Cathode(Structure):
     # Tuple of standard anions for typical battery insertion cathodes.
     standard_anions = ("O", "F")
 
+    # Maximum number of changes that are kept in the mutation journal.
+    mutation_journal_size = 100
+
+    # Method used to determine the neighbors of a site:
+    # "voronoi" - Neighbors in the voronoi decomposition of the structure.
+    # "cutoff" - Cation-anion pairs within a cutoff distance.
+    # "validate" - Use the cutoff neighbors, but warn if they differ from the
+    # voronoi neighbors.
+    neighbor_backend = "voronoi"
+
+    # Cutoff distances for the "cutoff" neighbor backend, as a dictionary
+    # mapping (cation, anion) tuples to a distance. Empty sites are designated
+    # as "Vac". Pairs which are not in the dictionary use DEFAULT_NEIGHBOR_CUTOFF.
+    neighbor_cutoffs = {}
+
     def __init__(self, lattice, species, coords, charge=None,
                  validate_proximity=False,
                  to_unit_cell=False, coords_are_cartesian=False,
@@ -108,7 +212,19 @@ class Cathode(Structure):
             site_properties=site_properties
         )
 
-        self._voronoi = None
+        # Derived data that only depends on the lattice and site coordinates,
+        # and data that also depends on the occupation of the sites.
+        self._geometry_cache = {}
+        self._structure_cache = {}
+
+        self._version = 0
+        self._mutation_journal = []
+
+        # Voronoi cells of the sites, which are updated incrementally when
+        # sites are moved.
+        self._voronoi_table = VoronoiNeighborTable()
+
+        self._setup_site_arrays()
 
     def __str__(self):
         """
@@ -138,7 +254,7 @@ class Cathode(Structure):
         keys = sorted(props.keys())
         vesta_index = 1
         for i, site in enumerate(self):
-            if site.species_and_occu.num_atoms == 0:
+            if site.species.num_atoms == 0:
                 row = [str(i), "-", "Vac"]
 
             else:
@@ -156,11 +272,130 @@ class Cathode(Structure):
                      ))
         return "\n".join(outs)
 
+    def __getstate__(self):
+        # Leave out the cached data, which can be recalculated
+        state = self.__dict__.copy()
+        state["_geometry_cache"] = {}
+        state["_structure_cache"] = {}
+        state["_voronoi_table"] = VoronoiNeighborTable()
+        return state
+
     def __hash__(self):
-        return hash(str(self))
+        return hash(self.fingerprint)
 
     def __eq__(self, other):
-        return self == other.__hash__()
+        if self is other:
+            return True
+        if not isinstance(other, Cathode) or len(self) != len(other):
+            return False
+        return self.fingerprint == other.fingerprint
+
+    @property
+    def fingerprint(self):
+        """
+        Canonical fingerprint of the Cathode, based on the lattice, the
+        occupation of the sites and their fractional coordinates, rounded to
+        FINGERPRINT_TOL. The fingerprint does not depend on the order of the
+        sites, and is cached until the structure is changed.
+
+        Returns:
+            (str): Hexadecimal digest of the structure.
+
+        """
+        if "fingerprint" not in self._structure_cache:
+            lattice = np.round(self.lattice.matrix / FINGERPRINT_TOL)
+            coords = np.round(np.mod(self.frac_coords, 1) / FINGERPRINT_TOL)
+            coords = np.mod(coords, np.round(1 / FINGERPRINT_TOL))
+
+            # Sort the sites by their coordinates and species
+            order = np.lexsort(
+                (self._species_codes, coords[:, 2], coords[:, 1], coords[:, 0])
+            )
+
+            fingerprint = hashlib.sha1(lattice.astype(np.int64).tobytes())
+            fingerprint.update(self._species_codes[order].astype(np.int64).tobytes())
+            fingerprint.update(coords[order].astype(np.int64).tobytes())
+
+            # Mixed and partially occupied sites, as well as species with an
+            # oxidation state or spin, are fully described by their species
+            # string
+            mixed_sites = order[self._species_codes[order] == -1]
+            fingerprint.update(
+                "\n".join(self._species_strings[mixed_sites]).encode("utf8")
+            )
+            self._structure_cache["fingerprint"] = fingerprint.hexdigest()
+
+        return self._structure_cache["fingerprint"]
+
+    def __setitem__(self, i, site):
+        super(Cathode, self).__setitem__(i, site)
+        self._setup_site_arrays()
+
+    def __delitem__(self, i):
+        super(Cathode, self).__delitem__(i)
+        self._setup_site_arrays()
+
+    @property
+    def species_codes(self):
+        """
+        Integer codes of the occupation of each site, see get_species_code().
+
+        Returns:
+            (numpy.ndarray): Read-only array of the site species codes.
+
+        """
+        return _read_only(self._species_codes)
+
+    @property
+    def occupancies(self):
+        """
+        Total occupancy of each site, i.e. zero for the vacant sites.
+
+        Returns:
+            (numpy.ndarray): Read-only array of the site occupancies.
+
+        """
+        return _read_only(self._occupancies)
+
+    @property
+    def vacancy_mask(self):
+        """
+        Boolean mask of the sites with an empty Composition.
+
+        Returns:
+            (numpy.ndarray): Read-only boolean array.
+
+        """
+        return _read_only(self._occupancies == 0)
+
+    @property
+    def working_ion_mask(self):
+        """
+        Boolean mask of the sites that are occupied by a working ion.
+
+        Returns:
+            (numpy.ndarray): Read-only boolean array.
+
+        """
+        return np.isin(self._species_strings,
+                       Cathode.standard_working_ions)
+
+    @property
+    def working_ion_indices(self):
+        """
+        Indices of the sites that are occupied by a working ion. The array is
+        cached until the occupation of the sites changes.
+
+        Returns:
+            (numpy.ndarray): Read-only array of site indices.
+
+        """
+        if "working_ion_indices" not in self._structure_cache:
+            self._structure_cache["working_ion_indices"] = np.flatnonzero(
+                self.working_ion_mask
+            )
+
+        return _read_only(self._structure_cache["working_ion_indices"])
 
     @property
     def working_ion_configuration(self):
@@ -172,8 +407,7 @@ class Cathode(Structure):
                 in the Cathode.
 
         """
-        return [site for site in self.sites
-                if site.species_string in Cathode.standard_working_ions]
+        return [self._sites[index] for index in self.working_ion_indices]
 
     @working_ion_configuration.setter
     def working_ion_configuration(self, configuration):
@@ -189,29 +423,29 @@ class Cathode(Structure):
         """
         # TODO Add checks
 
-        # Remove all working ions
-        for working_ion in [ion for ion in Cathode.standard_working_ions
-                            if Element(ion) in set(self.composition.keys())]:
-            self.replace_species({working_ion: {working_ion: 0}})
-
-        # Add the working ion sites
         if isinstance(configuration, dict):
+            indices = []
+            species = []
             for working_ion in configuration.keys():
-                for index in configuration[working_ion]:
-                    self.replace(index, working_ion, properties={"magmom": 0})
+                indices.extend(configuration[working_ion])
+                species.extend([working_ion] * len(configuration[working_ion]))
 
         elif all([isinstance(item, Site) for item in configuration]):
-            for ion_site in configuration:
-                for i, site in enumerate(self):
-                    if np.linalg.norm(site.distance(ion_site)) < 0.05:
-                        self.replace(i, ion_site.specie,
-                                     properties={"magmom": 0})
+            (ion_indices, indices) = self.find_site_indices(configuration)
+            species = [configuration[i].species for i in ion_indices]
 
         else:
             raise TypeError("Working ion configurations should be a dictionary "
                             "mapping working ions to site indices, or a list of "
                             "sites.")
 
+        # Remove all working ions
+        self._set_site_species(self.working_ion_indices, Composition(),
+                               properties={"magmom": 0})
+
+        # Add the working ion sites
+        self._set_site_species(indices, species, properties={"magmom": 0})
+
     @property
     def concentration(self):
         """
@@ -222,29 +456,457 @@ class Cathode(Structure):
             (float): The working ion concentration
 
         """
-        working_ion_sites = [site for site in self.sites if
-                             site.species_string in self.standard_working_ions
-                             or site.species_and_occu == Composition()]
-        return len(self.working_ion_configuration) / len(working_ion_sites)
+        working_ion_mask = self.working_ion_mask
+        return int(working_ion_mask.sum()) / \
+            int((working_ion_mask | self.vacancy_mask).sum())
 
     @property
     def voronoi(self):
         """
         Pymatgen ChemEnv voronoi decomposition of the cathode structure.
 
+        Since the empty sites are kept in the structure, the decomposition only
+        depends on the geometry of the Cathode. It is therefore shared with all
+        Cathodes that have the same geometry key, e.g. different working ion
+        configurations of the same structure, and stored in the pybat disk
+        cache for use in other processes. Note that this means only the
+        indices, distances and angles of the neighbors should be relied upon,
+        not the species of their sites.
+
         Returns:
             pymatgen.analysis.chemenv.coordination_environments.voronoi.\
             DetailedVoronoiContainer
 
         """
-        if self._voronoi is None:
-            self._voronoi = DetailedVoronoiContainer(self)
+        if "voronoi" not in self._geometry_cache:
+            voronoi = geometry_registry.get("voronoi", self.geometry_key)
+
+            if voronoi is None:
+                cache_key = disk_cache.make_key("voronoi", self.geometry_key)
+                voronoi = disk_cache.get(cache_key)
+
+                if voronoi is None:
+                    voronoi = DetailedVoronoiContainer(self)
+                    disk_cache.set(cache_key, voronoi)
+
+                geometry_registry.add("voronoi", self.geometry_key, voronoi)
 
-        return self._voronoi
+            self._geometry_cache["voronoi"] = voronoi
+
+        return self._geometry_cache["voronoi"]
 
     @voronoi.setter
     def voronoi(self, voronoi_container):
-        self._voronoi = voronoi_container
+        self._geometry_cache["voronoi"] = voronoi_container
+
+    @property
+    def geometry_key(self):
+        """
+        Key that identifies the geometry of the Cathode, based on the lattice
+        and the fractional coordinates of the sites, rounded to
+        FINGERPRINT_TOL. Contrary to the fingerprint, it does not depend on the
+        occupation of the sites, but does depend on their order, since the
+        geometry data shared between Cathodes refers to the sites by index.
+
+        Note that Cathodes which are sorted by species, e.g. the configurations
+        returned by from_atoms_arrays(), generally have their sites in a
+        different order and hence a different geometry key, even if they are
+        derived from the same parent structure. These only share geometry data
+        in case their sites happen to end up in the same order.
+
+        Returns:
+            (str): Hexadecimal digest of the geometry.
+
+        """
+        if "geometry_key" not in self._geometry_cache:
+            lattice = np.round(self.lattice.matrix / FINGERPRINT_TOL)
+            coords = np.round(np.mod(self.frac_coords, 1) / FINGERPRINT_TOL)
+            coords = np.mod(coords, np.round(1 / FINGERPRINT_TOL))
+
+            geometry_key = hashlib.sha1(lattice.astype(np.int64).tobytes())
+            geometry_key.update(coords.astype(np.int64).tobytes())
+            self._geometry_cache["geometry_key"] = geometry_key.hexdigest()
+
+        return self._geometry_cache["geometry_key"]
+
+    @property
+    def version(self):
+        """
+        Version number of the Cathode, which is increased every time the
+        structure is changed.
+
+        Returns:
+            (int): Version number.
+
+        """
+        return self._version
+
+    def get_mutations(self, version):
+        """
+        Get the changes made to the Cathode since a certain version from the
+        mutation journal.
+
+        Args:
+            version (int): Version of the Cathode from which to list the
+                changes.
+
+        Returns:
+            (list): List of (version, kind, indices) tuples, see
+                _record_mutation(). Returns None in case the journal no
+                longer contains all the changes since the requested version.
+
+        """
+        mutations = [mutation for mutation in self._mutation_journal
+                     if mutation[0] > version]
+
+        if self._version - version > len(mutations):
+            return None
+        else:
+            return mutations
+
+    @property
+    def lattice(self):
+        return self._lattice
+
+    @lattice.setter
+    def lattice(self, lattice):
+        # Older pymatgen versions only allow modifying the lattice with
+        # Structure.modify_lattice()
+        if Structure.lattice.fset is not None:
+            Structure.lattice.fset(self, lattice)
+        else:
+            super(Cathode, self).modify_lattice(lattice)
+        self._record_mutation("geometry")
+
+    def modify_lattice(self, new_lattice):
+        self.lattice = new_lattice
+
+    # The overrides below refresh the site arrays and record the mutation of
+    # the changed structure. Some pymatgen methods can also return a modified
+    # copy instead of changing the structure in place.
+
+    def replace(self, i, species, coords=None, *args, **kwargs):
+        result = super(Cathode, self).replace(i, species, coords, *args,
+                                              **kwargs)
+        self._update_site_arrays([i, ])
+
+        if coords is None:
+            self._record_mutation("occupancy", [i, ])
+        else:
+            self._record_mutation("geometry", [i, ])
+
+        return result
+
+    def insert(self, *args, **kwargs):
+        result = super(Cathode, self).insert(*args, **kwargs)
+        self._setup_site_arrays()
+        return result
+
+    def remove_sites(self, *args, **kwargs):
+        result = super(Cathode, self).remove_sites(*args, **kwargs)
+        self._setup_site_arrays()
+        return result
+
+    def remove_species(self, *args, **kwargs):
+        result = super(Cathode, self).remove_species(*args, **kwargs)
+        self._setup_site_arrays()
+        return result
+
+    def replace_species(self, *args, **kwargs):
+        result = super(Cathode, self).replace_species(*args, **kwargs)
+        (self if result is None else result)._update_all_site_species()
+        return result
+
+    def add_oxidation_state_by_element(self, *args, **kwargs):
+        result = super(Cathode, self).add_oxidation_state_by_element(
+            *args, **kwargs
+        )
+        self._update_all_site_species()
+        return result
+
+    def add_oxidation_state_by_site(self, *args, **kwargs):
+        result = super(Cathode, self).add_oxidation_state_by_site(
+            *args, **kwargs
+        )
+        self._update_all_site_species()
+        return result
+
+    def add_oxidation_state_by_guess(self, *args, **kwargs):
+        result = super(Cathode, self).add_oxidation_state_by_guess(
+            *args, **kwargs
+        )
+        self._update_all_site_species()
+        return result
+
+    def remove_oxidation_states(self, *args, **kwargs):
+        result = super(Cathode, self).remove_oxidation_states(*args, **kwargs)
+        self._update_all_site_species()
+        return result
+
+    def add_spin_by_element(self, *args, **kwargs):
+        result = super(Cathode, self).add_spin_by_element(*args, **kwargs)
+        self._update_all_site_species()
+        return result
+
+    def add_spin_by_site(self, *args, **kwargs):
+        result = super(Cathode, self).add_spin_by_site(*args, **kwargs)
+        self._update_all_site_species()
+        return result
+
+    def remove_spin(self, *args, **kwargs):
+        result = super(Cathode, self).remove_spin(*args, **kwargs)
+        self._update_all_site_species()
+        return result
+
+    def relabel_sites(self, *args, **kwargs):
+        result = super(Cathode, self).relabel_sites(*args, **kwargs)
+        self._update_all_site_species()
+        return result
+
+    def substitute(self, *args, **kwargs):
+        result = super(Cathode, self).substitute(*args, **kwargs)
+        self._setup_site_arrays()
+        return result
+
+    def sort(self, *args, **kwargs):
+        result = super(Cathode, self).sort(*args, **kwargs)
+        self._setup_site_arrays()
+        return result
+
+    def merge_sites(self, *args, **kwargs):
+        result = super(Cathode, self).merge_sites(*args, **kwargs)
+        self._setup_site_arrays()
+        return result
+
+    def make_supercell(self, *args, **kwargs):
+        result = super(Cathode, self).make_supercell(*args, **kwargs)
+        (self if result is None else result)._setup_site_arrays()
+        return result
+
+    def add_site_property(self, *args, **kwargs):
+        result = super(Cathode, self).add_site_property(*args, **kwargs)
+        self._record_mutation("properties")
+        return result
+
+    def remove_site_property(self, *args, **kwargs):
+        result = super(Cathode, self).remove_site_property(*args, **kwargs)
+        self._record_mutation("properties")
+        return result
+
+    def scale_lattice(self, *args, **kwargs):
+        result = super(Cathode, self).scale_lattice(*args, **kwargs)
+        self._record_mutation("geometry")
+        return result
+
+    def translate_sites(self, indices, *args, **kwargs):
+        result = super(Cathode, self).translate_sites(indices, *args,
+                                                      **kwargs)
+        self._record_mutation("geometry", indices)
+        return result
+
+    def rotate_sites(self, indices=None, *args, **kwargs):
+        result = super(Cathode, self).rotate_sites(indices, *args, **kwargs)
+        self._record_mutation("geometry", indices)
+        return result
+
+    def perturb(self, *args, **kwargs):
+        result = super(Cathode, self).perturb(*args, **kwargs)
+        self._record_mutation("geometry")
+        return result
+
+    def apply_operation(self, *args, **kwargs):
+        result = super(Cathode, self).apply_operation(*args, **kwargs)
+        self._record_mutation("geometry")
+        return result
+
+    def _record_mutation(self, kind, indices=None):
+        """
+        Record a change of the Cathode in the mutation journal, and invalidate
+        the derived data that depends on it. Changes to the occupation of the
+        sites keep the data that only depends on the geometry of the structure,
+        such as the voronoi decomposition.
+
+        Args:
+            kind (str): Kind of change:
+
+            "occupancy" - Only the occupation of the sites has changed.
+
+            "geometry" - The lattice or the coordinates of the sites have
+            changed.
+
+            "sites" - Sites have been added, removed or reordered.
+
+            "properties" - The site properties have changed, e.g. the
+            magnetic moments, which affect the symmetry of the structure.
+
+            indices (list): Indices of the sites that have changed. None means
+                all the sites could have changed.
+
+        """
+        if indices is not None:
+            indices = tuple(int(index) for index in np.ravel(indices))
+
+        self._version += 1
+        self._mutation_journal.append((self._version, kind, indices))
+        del self._mutation_journal[:-self.mutation_journal_size]
+
+        self._structure_cache.clear()
+
+        if kind in ("geometry", "sites"):
+            self._geometry_cache.clear()
+
+            if kind == "geometry" and indices is not None:
+                self._voronoi_table.move_sites(indices)
+            else:
+                self._voronoi_table = VoronoiNeighborTable()
+
+    def _setup_site_arrays(self):
+        """
+        Set up the arrays that describe the occupation of the sites from
+        scratch, i.e. the species strings, species codes and occupancies.
+
+        """
+        self._species_strings = np.array(
+            [site.species_string for site in self._sites], dtype=object
+        )
+        self._species_codes = np.array(
+            [get_species_code(site.species) for site in self._sites],
+            dtype=int
+        )
+        self._occupancies = np.array(
+            [site.species.num_atoms for site in self._sites],
+            dtype=float
+        )
+        self._record_mutation("sites")
+
+    def _update_all_site_species(self):
+        """
+        Update the site occupation arrays after the species of possibly all
+        sites have been changed in place, e.g. by adding oxidation states.
+
+        """
+        self._update_site_arrays(range(len(self)))
+        self._record_mutation("occupancy")
+
+    def _get_frac_coords(self):
+        """
+        Fractional coordinates of the sites, cached until the geometry changes.
+
+        Returns:
+            (numpy.ndarray): Read-only (N, 3) array of fractional coordinates.
+
+        """
+        if "frac_coords" not in self._geometry_cache:
+            self._geometry_cache["frac_coords"] = self.frac_coords
+
+        return _read_only(self._geometry_cache["frac_coords"])
+
+    def _get_site_indices(self, sites):
+        """
+        Convert a list or array of site indices or a boolean site mask into an
+        array of site indices.
+
+        Args:
+            sites: List or array of site indices, or a boolean mask with a value
+                for each site in the Cathode.
+
+        Returns:
+            (numpy.ndarray): Array of site indices.
+
+        """
+        sites = np.asarray(sites)
+
+        if sites.dtype == bool:
+            if sites.shape != (len(self),):
+                raise ValueError("Site mask does not match the number of sites "
+                                 "in the Cathode.")
+            return np.flatnonzero(sites)
+
+        elif sites.size == 0:
+            return np.array([], dtype=int)
+
+        elif np.issubdtype(sites.dtype, np.integer):
+            return sites.ravel()
+
+        else:
+            raise TypeError("Sites should be provided as site indices or a "
+                            "boolean mask.")
+
+    def _set_site_species(self, indices, species, properties=None):
+        """
+        Change the occupation of a set of sites in one pass, leaving their
+        coordinates unchanged.
+
+        Args:
+            indices (list): List or array of site indices.
+            species: Species or list of species, one for each index. A species
+                can be anything that is accepted by a pymatgen.PeriodicSite.
+            properties (dict): Site properties to update for the changed sites.
+                Other properties of the sites are kept.
+
+        """
+        indices = [int(index) for index in indices]
+
+        if isinstance(species, (list, tuple)):
+            if len(species) != len(indices):
+                raise ValueError("Number of species does not match the number "
+                                 "of site indices.")
+        else:
+            species = [species] * len(indices)
+
+        for index, new_species in zip(indices, species):
+            site = self._sites[index]
+            site_properties = dict(site.properties)
+            site_properties.update(properties or {})
+            self._sites[index] = PeriodicSite(
+                new_species, site.frac_coords, self._lattice,
+                properties=site_properties
+            )
+
+        self._update_site_arrays(indices)
+        self._record_mutation("occupancy", indices)
+
+    def _update_site_arrays(self, indices):
+        """
+        Update the site occupation arrays for the sites with the provided
+        indices only.
+
+        Args:
+            indices (list): List of site indices which have been changed.
+
+        """
+        for index in indices:
+            site = self._sites[index]
+            self._species_strings[index] = site.species_string
+            self._species_codes[index] = get_species_code(site.species)
+            self._occupancies[index] = site.species.num_atoms
+
+    def find_site_indices(self, sites):
+        """
+        Find the indices of the sites in the Cathode that correspond to a list
+        of pymatgen.Sites, i.e. that are within SITE_MATCHING_TOL of the site
+        coordinates, taking periodic images into account.
+
+        Args:
+            sites (list): List of pymatgen.Sites to look for.
+
+        Returns:
+            (tuple): Two integer arrays of equal length. The first contains the
+                indices of the provided sites, the second the indices of the
+                Cathode sites they were matched with.
+
+        """
+        if len(sites) == 0:
+            return np.array([], dtype=int), np.array([], dtype=int)
+
+        if "site_index" not in self._geometry_cache:
+            self._geometry_cache["site_index"] = PeriodicSiteIndex(
+                self.lattice, self._get_frac_coords(), tol=SITE_MATCHING_TOL
+            )
+
+        return self._geometry_cache["site_index"].query(
+            self.lattice.get_fractional_coords([site.coords for site in sites])
+        )
 
     def add_cations(self, sites=None):
         """
@@ -259,22 +921,23 @@ class Cathode(Structure):
 
         # Add the cation sites
         if isinstance(sites, dict):
+            indices = []
+            species = []
             for cation in sites.keys():
-                for index in sites[cation]:
-                    self.replace(index, cation, properties={"magmom": 0})
+                indices.extend(sites[cation])
+                species.extend([cation] * len(sites[cation]))
 
         elif all([isinstance(item, Site) for item in sites]):
-            for catsite in sites:
-                for i, site in enumerate(self):
-                    if np.linalg.norm(site.distance(catsite)) < 0.05:
-                        self.replace(i, catsite.specie,
-                                     properties={"magmom": 0})
+            (cation_indices, indices) = self.find_site_indices(sites)
+            species = [sites[i].species for i in cation_indices]
 
         else:
             raise TypeError("Cation configurations should be a dictionary "
                             "mapping cations to site indices or a list of "
                             "sites.")
 
+        self._set_site_species(indices, species, properties={"magmom": 0})
+
     def remove_working_ions(self, sites=None):
         """
         Remove working ions from the cathode, i.e. delithiate the structure in
@@ -284,7 +947,7 @@ class Cathode(Structure):
         The occupancy is simply adjusted to an empty Composition object.
 
         Args:
-            sites: List of indices OR
+            sites: List or array of indices, a boolean site mask OR
                 List of pymatgen.core.Sites which are to be removed.
 
         Returns:
@@ -292,31 +955,51 @@ class Cathode(Structure):
 
         """
 
-        # TODO add checks
-
         # If no sites are given
         if sites is None:
             # Remove all the working ions
-            self.working_ion_configuration = []
-
-        # If a List of integers is given
-        elif all([isinstance(item, int) for item in sites]):
-            for index in sites:
-                self.replace(index, Composition(), properties={"magmom": 0})
+            indices = self.working_ion_indices
 
         # If a List of sites is given
-        elif all([isinstance(item, Site) for item in sites]):
-            for site in sites:
-                # Check if the provided site corresponds to a working ion site
-                if site in self.working_ion_configuration:
-                    ion_configuration = self.working_ion_configuration.copy()
-                    ion_configuration.remove(site)
-                    self.working_ion_configuration = ion_configuration
-                else:
-                    raise Warning("Requested site not found in working ion "
-                                  "configuration.")
+        elif len(sites) > 0 and all([isinstance(item, Site) for item in sites]):
+            (site_indices, indices) = self.find_site_indices(sites)
+
+            # Check if the provided sites correspond to working ion sites
+            is_working_ion = self.working_ion_mask[indices] & (
+                self._species_strings[indices] ==
+                [sites[i].species_string for i in site_indices]
+            )
+            indices = indices[is_working_ion]
+
+            if len(set(site_indices[is_working_ion])) != len(sites):
+                raise Warning("Requested site not found in working ion "
+                              "configuration.")
+
+        # If an array of indices or a boolean mask is given
         else:
-            raise IOError("Incorrect site input.")
+            try:
+                indices = self._get_site_indices(sites)
+            except TypeError:
+                raise IOError("Incorrect site input.")
+
+        self.create_vacancies(indices)
+
+    def create_vacancies(self, sites):
+        """
+        Empty a set of sites in one pass, i.e. set their occupancy to an empty
+        Composition and their magnetic moment to zero. The sites themselves
+        are not removed from the Cathode.
+
+        Args:
+            sites: List or array of site indices, or a boolean mask with a value
+                for each site in the Cathode.
+
+        Returns:
+            None
+
+        """
+        self._set_site_species(self._get_site_indices(sites), Composition(),
+                               properties={"magmom": 0})
 
     def change_site_distance(self, sites, distance):
         """
@@ -434,50 +1117,502 @@ class Cathode(Structure):
         """
         raise NotImplementedError
 
-    def find_noneq_cations(self):
+    def get_symmetry_context(self, symprec=DEFAULT_SYMPREC,
+                             angle_tolerance=DEFAULT_ANGLE_TOLERANCE):
         """
-        Find a list of the site indices of all non-equivalent cations.
+        Get the symmetry context of the Cathode, i.e. the result of the
+        symmetry analysis that is shared by all methods which check the
+        equivalence of sites or dimers. The context is cached until the
+        structure or the magnetic moments of the sites change, and is stored in
+        the pybat disk cache based on the geometry key, site species and
+        magnetic moments of the Cathode and the tolerances. The fingerprint can
+        not be used for this, as the context depends on the order of the sites.
+
+        Args:
+            symprec (float): Distance tolerance for the symmetry analysis.
+            angle_tolerance (float): Angle tolerance for the symmetry analysis.
 
         Returns:
-            (list): List of site indices
+            pybat.symmetry.SymmetryContext
 
         """
-        symmops = SpacegroupAnalyzer(self).get_space_group_operations()
+        key = ("symmetry_context", symprec, angle_tolerance)
 
-        cation_indices = [
-            index for index in range(len(self.sites))
-            if not self.sites[index].species_string not in Cathode.standard_anions
-        ]
+        if key not in self._structure_cache:
+            magmom = self.site_properties.get("magmom", None)
+            if magmom is not None:
+                magmom = np.round(np.array(magmom, dtype=float),
+                                  MAGMOM_DECIMALS).tolist()
+
+            cache_key = disk_cache.make_key(
+                self.geometry_key, self._species_strings.tolist(), magmom,
+                *key
+            )
+            context = disk_cache.get(cache_key)
+
+            if context is None:
+                context = SymmetryContext(
+                    self, symprec=symprec, angle_tolerance=angle_tolerance
+                )
+                disk_cache.set(cache_key, context)
+            else:
+                context.attach(self)
+
+            self._structure_cache[key] = context
+
+        return self._structure_cache[key]
+
+    def get_space_group_operations(self, symprec=DEFAULT_SYMPREC,
+                                   angle_tolerance=DEFAULT_ANGLE_TOLERANCE):
+        """
+        Get the space group operations of the Cathode from its symmetry
+        context.
+
+        Args:
+            symprec (float): Distance tolerance for the symmetry analysis.
+            angle_tolerance (float): Angle tolerance for the symmetry analysis.
+
+        Returns:
+            pymatgen.symmetry.structure.SpacegroupOperations
+
+        """
+        return self.get_symmetry_context(
+            symprec, angle_tolerance
+        ).space_group_operations
+
+    def get_neighbors(self, site_index):
+        """
+        Get the neighbors of a site, using the neighbor backend of the Cathode.
+
+        Args:
+            site_index (int): Index of the site.
+
+        Returns:
+            (list): List of neighbor dictionaries, which contain at least the
+                "index" of the neighboring site.
+
+        """
+        if self.neighbor_backend == "voronoi":
+            return self.get_voronoi_neighbors(site_index)
+
+        elif self.neighbor_backend == "cutoff":
+            return self.get_cutoff_neighbors(site_index)
+
+        elif self.neighbor_backend == "validate":
+            differences = self.compare_neighbor_backends([site_index, ])
+            if differences:
+                warnings.warn(
+                    "Cutoff neighbors of site " + str(site_index)
+                    + " differ from the voronoi neighbors. Missing: "
+                    + str(differences[site_index][0]) + ", extra: "
+                    + str(differences[site_index][1]) + "."
+                )
+            return self.get_cutoff_neighbors(site_index)
+
+        else:
+            raise ValueError("Neighbor backend is not recognized.")
+
+    def get_voronoi_neighbors(self, site_index):
+        """
+        Get the neighbors of a site in the voronoi decomposition, using
+        VORONOI_DIST_FACTOR and VORONOI_ANG_FACTOR.
+
+        In case the voronoi decomposition of the full structure is already
+        available, the neighbors are taken from there. Otherwise only the
+        voronoi cell of the requested site is constructed, which gives the same
+        neighbors but is much faster when only a few sites are of interest. The
+        voronoi cells are kept when sites are moved, except for the cells of
+        the moved sites and their neighbors.
+
+        Args:
+            site_index (int): Index of the site.
+
+        Returns:
+            (list): List of neighbor dictionaries, which contain at least the
+                "index" of the neighboring site.
+
+        """
+        if "voronoi" not in self._geometry_cache:
+            voronoi = geometry_registry.get("voronoi", self.geometry_key)
+            if voronoi is not None:
+                self._geometry_cache["voronoi"] = voronoi
+
+        if "voronoi" in self._geometry_cache:
+            return self._geometry_cache["voronoi"].neighbors(
+                site_index, VORONOI_DIST_FACTOR, VORONOI_ANG_FACTOR
+            )
+
+        return self._voronoi_table.get_neighbors(
+            self.lattice, self._get_frac_coords(), site_index,
+            VORONOI_DIST_FACTOR, VORONOI_ANG_FACTOR
+        )
+
+    def get_cutoff_neighbors(self, site_index):
+        """
+        Get the neighbors of a site based on the cation-anion cutoffs in
+        neighbor_cutoffs. The neighbors of a cation (or empty) site are the
+        anions within the cutoff distance and vice versa.
+
+        Args:
+            site_index (int): Index of the site.
+
+        Returns:
+            (list): List of neighbor dictionaries with the "index", "image"
+                and "distance" of each neighbor.
+
+        """
+        (centers, neighbors, images, distances) = self._get_cutoff_edges()
+
+        edges = slice(*np.searchsorted(centers, [site_index, site_index + 1]))
+
+        return [{"index": int(index), "image": image, "distance": distance}
+                for index, image, distance in zip(neighbors[edges],
+                                                  images[edges],
+                                                  distances[edges])]
+
+    def _get_cutoff_edges(self):
+        """
+        Find the cation-anion pairs within the cutoff distances of
+        neighbor_cutoffs for all sites at once. The pairs within the largest
+        cutoff are cached until the geometry changes, the selected pairs until
+        the structure changes.
+
+        Returns:
+            (tuple): Arrays of the centers, neighbors, images and distances of
+                all pairs, sorted by center.
+
+        """
+        max_cutoff = max([DEFAULT_NEIGHBOR_CUTOFF, ]
+                         + list(self.neighbor_cutoffs.values()))
+
+        if ("cutoff_pairs", max_cutoff) not in self._geometry_cache:
+            self._geometry_cache[("cutoff_pairs", max_cutoff)] = \
+                find_cutoff_neighbors(self.lattice, self._get_frac_coords(),
+                                      max_cutoff)
+
+        key = ("cutoff_edges", tuple(sorted(self.neighbor_cutoffs.items())))
+
+        if key not in self._structure_cache:
+            (centers, neighbors, images, distances) = \
+                self._geometry_cache[("cutoff_pairs", max_cutoff)]
+
+            # Only keep the cation-anion pairs
+            is_anion = np.isin(self._species_strings, Cathode.standard_anions)
+            keep = is_anion[neighbors] != is_anion[centers]
+
+            species = np.where(self._species_strings == "", "Vac",
+                               self._species_strings)
+            cations = np.where(is_anion[centers], species[neighbors],
+                               species[centers])[keep]
+            anions = np.where(is_anion[centers], species[centers],
+                              species[neighbors])[keep]
+
+            if keep.any():
+                # Look up the cutoff of each distinct species pair only once
+                (cation_species, cation_codes) = np.unique(
+                    cations, return_inverse=True
+                )
+                (anion_species, anion_codes) = np.unique(
+                    anions, return_inverse=True
+                )
+                pair_cutoffs = np.array([
+                    [self.neighbor_cutoffs.get((cation, anion),
+                                               DEFAULT_NEIGHBOR_CUTOFF)
+                     for anion in anion_species]
+                    for cation in cation_species
+                ], dtype=float)
+                cutoffs = pair_cutoffs[cation_codes.ravel(),
+                                       anion_codes.ravel()]
+                keep[keep] = distances[keep] <= cutoffs
+
+            self._structure_cache[key] = (centers[keep], neighbors[keep],
+                                          images[keep], distances[keep])
+
+        return self._structure_cache[key]
+
+    @property
+    def neighbor_graph(self):
+        """
+        Neighbor graph of all the sites in the Cathode, see
+        get_neighbor_graph().
+
+        """
+        return self.get_neighbor_graph()
+
+    def get_neighbor_graph(self, site_indices=None):
+        """
+        Get the neighbor graph of the Cathode, using the neighbor backend. The
+        graph is cached and extended with the neighbors of more sites when
+        needed, so in case site indices are provided only the neighbors of
+        those sites are guaranteed to be included. This way the environment of
+        a few sites can be studied without considering the whole structure.
+
+        Args:
+            site_indices (list): Indices of the sites whose neighbors should be
+                included in the graph. Defaults to all sites.
+
+        Returns:
+            pybat.neighbors.NeighborGraph
+
+        """
+        # The voronoi neighbors only depend on the geometry, the cutoff
+        # neighbors also on the species.
+        if self.neighbor_backend == "voronoi":
+            cache = self._geometry_cache
+        else:
+            cache = self._structure_cache
+
+        key = ("neighbor_graph", self.neighbor_backend)
+
+        if self.neighbor_backend == "cutoff":
+
+            if key not in cache:
+                (centers, neighbors, images, distances) = \
+                    self._get_cutoff_edges()
+                indptr = np.concatenate(
+                    ([0], np.cumsum(np.bincount(centers, minlength=len(self))))
+                )
+                cache[key] = NeighborGraph(indptr, neighbors, images,
+                                           distances)
+
+            return cache[key]
+
+        required = np.zeros(len(self), dtype=bool)
+        if site_indices is None:
+            required[:] = True
+        else:
+            required[np.array(site_indices, dtype=int)] = True
+
+        graph = cache.get(key)
+        if graph is None:
+            graph = NeighborGraph.empty(len(self))
+
+        # Only the neighbors of the sites which are not in the graph yet are
+        # determined and added to the graph
+        missing_sites = np.flatnonzero(required & ~graph.row_mask)
+
+        if len(missing_sites) > 0:
+            frac_coords = self._get_frac_coords()
+            neighbor_lists = {}
+
+            for index in missing_sites:
+                neighbor_list = []
+
+                for neighbor in self.get_neighbors(int(index)):
+                    # The neighbors from the full voronoi decomposition only
+                    # contain the site of the neighbor image
+                    if "image" in neighbor:
+                        image = neighbor["image"]
+                    else:
+                        image = neighbor["site"].frac_coords \
+                            - frac_coords[neighbor["index"]]
+
+                    neighbor_list.append({"index": neighbor["index"],
+                                          "image": image,
+                                          "distance": neighbor["distance"]})
+
+                neighbor_lists[int(index)] = neighbor_list
+
+            graph = graph.add_rows(neighbor_lists)
+
+        cache[key] = graph
+
+        return graph
+
+    def get_neighbor_indices(self, site_index, species=None):
+        """
+        Get the indices of the neighbors of a site from the neighbor graph.
+
+        Args:
+            site_index (int): Index of the site.
+            species (list): Species strings of the neighbors to return, e.g.
+                ["O", ]. Use "Vac" for vacancies. Defaults to all neighbors.
+
+        Returns:
+            (numpy.ndarray): Neighbor indices.
+
+        """
+        return self.get_neighbor_graph([site_index, ]).get_neighbors(
+            site_index, self._get_species_mask(species)
+        )
+
+    def get_shared_neighbors(self, site_a, site_b, species=None):
+        """
+        Get the indices of the sites that are neighbors of two sites.
+
+        Args:
+            site_a (int): Index of the first site.
+            site_b (int): Index of the second site.
+            species (list): Species strings of the neighbors to return, see
+                get_neighbor_indices().
+
+        Returns:
+            (numpy.ndarray): Sorted array of the shared neighbor indices.
+
+        """
+        return self.get_neighbor_graph([site_a, site_b]).get_shared_neighbors(
+            site_a, site_b, self._get_species_mask(species)
+        )
+
+    def get_environment(self, site_indices, k=1, species=None):
+        """
+        Get the k-shell environment of a set of sites, i.e. all the sites that
+        can be reached from the sites in at most k steps over the neighbor
+        graph, excluding the sites themselves.
+
+        Args:
+            site_indices (list): Indices of the sites.
+            k (int): Number of neighbor shells.
+            species (list): Species strings of the sites to return, see
+                get_neighbor_indices(). The shells are still determined using
+                all sites.
+
+        Returns:
+            (numpy.ndarray): Sorted array of the site indices in the
+                environment.
+
+        """
+        site_indices = np.unique(np.array(site_indices, dtype=int))
+        environment = site_indices
+
+        # Only the neighbors of each shell are added to the graph
+        for _ in range(k):
+            graph = self.get_neighbor_graph(environment)
+            environment = np.union1d(
+                environment, graph.get_shell(environment, k=1)
+            )
+
+        environment = np.setdiff1d(environment, site_indices)
+
+        return environment[self._get_species_mask(species)[environment]]
+
+    def _get_species_mask(self, species):
+        """
+        Boolean mask of the sites occupied by one of the provided species.
+
+        Args:
+            species (list): Species strings, or a single species string. None
+                selects all sites.
+
+        Returns:
+            (numpy.ndarray): Boolean array over all sites.
+
+        """
+        if species is None:
+            return np.ones(len(self), dtype=bool)
+        if isinstance(species, str):
+            species = [species, ]
+
+        return np.isin(self._species_strings,
+                       ["" if string == "Vac" else string
+                        for string in species])
+
+    def compare_neighbor_backends(self, site_indices=None):
+        """
+        Compare the neighbors found with the cutoff backend with the ones in the
+        voronoi decomposition, in order to validate the cutoff distances.
+
+        Args:
+            site_indices (list): Indices of the sites to compare. Defaults to
+                all sites.
 
-        # Start with adding the first cation
-        inequiv_cations = [cation_indices[0], ]
+        Returns:
+            (dict): Dictionary mapping the indices of the sites for which the
+                backends disagree to a tuple of two sorted lists: the voronoi
+                neighbors that are missing in the cutoff neighbors, and the
+                cutoff neighbors that are not voronoi neighbors.
 
-        for index in cation_indices[1:]:
+        """
+        if site_indices is None:
+            site_indices = range(len(self))
 
-            s1 = [self.sites[index], ]
+        differences = {}
 
-            # Check if the site is equivalent with one of the sites in the
-            # inequivalent list.
-            inequivalent = True
+        for index in site_indices:
+            voronoi_neighbors = set(neighbor["index"] for neighbor
+                                    in self.get_voronoi_neighbors(index))
+            cutoff_neighbors = set(neighbor["index"] for neighbor
+                                   in self.get_cutoff_neighbors(index))
 
-            for inequive_index in inequiv_cations:
+            if voronoi_neighbors != cutoff_neighbors:
+                differences[index] = (
+                    sorted(voronoi_neighbors - cutoff_neighbors),
+                    sorted(cutoff_neighbors - voronoi_neighbors)
+                )
 
-                s2 = [self.sites[inequive_index], ]
+        return differences
 
-                if symmops.are_symmetrically_equivalent(s1, s2):
-                    inequivalent = False
+    def find_noneq_cations(self, return_multiplicities=False):
+        """
+        Find a list of the site indices of all non-equivalent cations, i.e. all
+        sites that are not occupied by one of the standard anions, including
+        vacancies. The cation sites are partitioned into symmetry orbits using
+        the equivalent sites of the symmetry context, and the first site of
+        each orbit is used as its representative.
 
-            if inequivalent:
-                inequiv_cations.append(index)
+        Args:
+            return_multiplicities (bool): Also return the number of sites in
+                the orbit of each representative.
 
-        return inequiv_cations
+        Returns:
+            (list): List of site indices. In case return_multiplicities is True,
+                a tuple of the list of site indices and the list of
+                multiplicities.
+
+        """
+        equivalent_atoms = self.get_symmetry_context().equivalent_atoms
+
+        cation_indices = np.flatnonzero(
+            ~np.isin(self._species_strings, Cathode.standard_anions)
+        )
+
+        (_, first_indices, multiplicities) = np.unique(
+            equivalent_atoms[cation_indices], return_index=True,
+            return_counts=True
+        )
+        order = np.argsort(first_indices)
+
+        inequiv_cations = [int(index) for index
+                           in cation_indices[first_indices[order]]]
+
+        if return_multiplicities:
+            return inequiv_cations, [int(multiplicity) for multiplicity
+                                     in multiplicities[order]]
+        else:
+            return inequiv_cations
 
     def get_cation_configurations(self, substitution_sites, cation_list, sizes,
                                   concentration_restrictions=None,
-                                  max_configurations=None):
+                                  max_configurations=None, processes=None,
+                                  checkpoint_directory=None):
         """
         Get all non-equivalent cation configurations within a specified range of unit
-        cell sizes and based on certain restrictions.
+        cell sizes and based on certain restrictions, as a list of Cathodes. See
+        iter_cation_configurations() for a description of the arguments.
+
+        Returns:
+            (list): List of Cathodes representing different configurations.
+
+        """
+        return list(self.iter_cation_configurations(
+            substitution_sites=substitution_sites,
+            cation_list=cation_list,
+            sizes=sizes,
+            concentration_restrictions=concentration_restrictions,
+            max_configurations=max_configurations,
+            processes=processes,
+            checkpoint_directory=checkpoint_directory
+        ))
+
+    def iter_cation_configurations(self, substitution_sites, cation_list, sizes,
+                                   concentration_restrictions=None,
+                                   max_configurations=None, processes=None,
+                                   checkpoint_directory=None):
+        """
+        Generate all non-equivalent cation configurations within a specified range of
+        unit cell sizes and based on certain restrictions. The configurations are
+        yielded one by one as they are enumerated, so only one configuration is kept
+        in memory at a time.
 
         Based on the icet.tools.structure_enumeration.enumerate_structures() method.
         Because there are some issues with this method, related to the allowed
@@ -485,9 +1620,6 @@ class Cathode(Structure):
         that vacancies can not be inserted in enumerate_structures, which will require
         some workaround using Lawrencium.
 
-        Currently also returns a list of Cathodes, for easy implementation and usage. It
-        might be more useful/powerful to design it as a generator later.
-
         Args:
             substitution_sites (list): List of site indices or pymatgen.Sites to be
                 substituted.
@@ -503,9 +1635,22 @@ class Cathode(Structure):
                 versus the total amount of atoms in the unit cell.
                 E.g. {"Li": (0.2, 0.3)}; {"Ni": (0.1, 0.2, "Mn": (0.05, 0.1)}; ...
             max_configurations (int): Maximum number of configurations to generate.
-
-        Returns:
-            (list): List of Cathodes representing different configurations.
+            processes (int): Number of processes over which the enumeration is
+                distributed, sharded by supercell, see
+                pybat.enumeration.enumerate_structures(). The configurations are
+                yielded in the same order as for the serial enumeration in the
+                current process, which is used in case no number of processes is
+                provided.
+            checkpoint_directory (str): Directory in which the configurations are
+                stored as they are enumerated, together with a checkpoint of the
+                progress of the enumeration. In case the directory contains the
+                checkpoint of an earlier, interrupted run of the same enumeration,
+                the stored configurations are yielded first, after which the
+                enumeration is resumed from the checkpoint. See also
+                Cathode.read_configurations().
+
+        Yields:
+            pybat.core.Cathode: Cathode representing a configuration.
 
         """
         # Check substitution_site input
@@ -522,55 +1667,153 @@ class Cathode(Structure):
             else:
                 configuration_space.append([site.species_string, ])
 
-        # TODO adjust this once concentration restrictions work correctly for
-        # enumerate_structures
+        # Push all concentration restrictions into the enumeration, so
+        # configurations outside the allowed ranges are never generated
         if concentration_restrictions:
-            # Get the largest concentration restriction
-            enum_conc_restrictions = [
-                {k: v} for k, v in concentration_restrictions.items()
-                if v == max(concentration_restrictions.values())][0]
+            enum_conc_restrictions = {
+                "Lr" if el == "Vac" else el: tuple(v)
+                for el, v in concentration_restrictions.items()
+            }
         else:
-            concentration_restrictions = {}
             enum_conc_restrictions = None
 
-        configuration_list = []
-        configuration_generator = enumerate_structures(
-            atoms=AseAtomsAdaptor.get_atoms(self.as_ordered_structure()),
-            sizes=sizes,
-            chemical_symbols=configuration_space,
-            concentration_restrictions=enum_conc_restrictions
-        )
+        # The enumeration allows configurations on the edges of the
+        # concentration ranges, so these are filtered out based on the atomic
+        # numbers of each configuration, before any pymatgen objects are made.
+        if enum_conc_restrictions:
+            restricted_numbers = np.array(
+                [atomic_numbers[el] for el in enum_conc_restrictions.keys()]
+            )
+            (lower_limits, upper_limits) = np.array(
+                list(enum_conc_restrictions.values()), dtype=float
+            ).T
+        else:
+            restricted_numbers = np.zeros(0, dtype=int)
+            (lower_limits, upper_limits) = (np.zeros(0), np.zeros(0))
+
+        number_of_configurations = 0
+
         try:
             self.site_properties["magmom"]
         except KeyError:
             print("No magnetic moments found in structure, setting to zero.")
             self.add_site_property("magmom", [0] * len(self))
 
-        for atoms in configuration_generator:
+        # The parent sites are repeated in the same order in every unit cell of
+        # the supercells, so their magnetic moments are simply tiled.
+        parent_magmom = np.array(self.site_properties["magmom"],
+                                 dtype=float)[self._occupancies != 0]
+
+        parent_atoms = AseAtomsAdaptor.get_atoms(self.as_ordered_structure())
+
+        if checkpoint_directory is None:
+            checkpoint = None
+        else:
+            checkpoint = EnumerationCheckpoint(
+                checkpoint_directory,
+                parameters=(np.round(parent_atoms.cell, 6).tolist(),
+                            np.round(parent_atoms.positions, 6).tolist(),
+                            parent_atoms.numbers.tolist(),
+                            parent_magmom.tolist(),
+                            configuration_space,
+                            list(sizes),
+                            sorted(enum_conc_restrictions.items())
+                            if enum_conc_restrictions else None)
+            )
+
+            # Yield the configurations of earlier runs without enumerating them
+            for configuration in checkpoint.iter_results():
+                if number_of_configurations == max_configurations:
+                    return
+                number_of_configurations += 1
+                yield Cathode.from_dict(configuration)
+
+            if checkpoint.finished \
+                    or number_of_configurations == max_configurations:
+                return
+
+        # The enumeration is performed in the current process in case no number
+        # of processes is provided
+        configuration_generator = enumerate_structures(
+            atoms=parent_atoms,
+            sizes=sizes,
+            chemical_symbols=configuration_space,
+            concentration_restrictions=enum_conc_restrictions,
+            processes=1 if processes is None else processes,
+            start=None if checkpoint is None else checkpoint.position,
+            return_positions=True
+        )
+
+        # Configurations which have not been stored in the checkpoint yet
+        results = []
+        position = None if checkpoint is None else checkpoint.position
+        finished = False
 
-            structure = AseAtomsAdaptor.get_structure(atoms)
-            structure.add_site_property(
-                "magmom",
-                self.site_properties["magmom"] * int(len(structure) / len(self))
-            )
+        try:
+            for (atoms_position, atoms) in configuration_generator:
 
-            frac_composition = structure.composition.fractional_composition
-            elements = [str(el) for el in structure.composition.elements]
-            c = concentration_restrictions
+                if number_of_configurations == max_configurations:
+                    break
 
-            if all([c[el][0] < frac_composition[el] < c[el][1]
-                    for el in elements if c.get(el, False)]):
-                cathode = Cathode.from_structure(structure.get_sorted_structure())
-                cathode.remove_working_ions(
-                    [i for i, site in enumerate(cathode)
-                     if site.species_string == "Lr"]
+                # Elements which are not present in the configuration are not
+                # checked
+                counts = np.sum(
+                    atoms.numbers[:, np.newaxis] == restricted_numbers, axis=0
                 )
-                configuration_list.append(cathode)
+                concentrations = counts / len(atoms)
+
+                if np.all((counts == 0) | ((lower_limits < concentrations)
+                                           & (concentrations < upper_limits))):
+                    cathode = Cathode.from_atoms_arrays(
+                        cell=np.array(atoms.cell),
+                        numbers=atoms.numbers,
+                        positions=atoms.positions,
+                        magmom=np.tile(parent_magmom,
+                                       len(atoms) // len(parent_magmom)),
+                        vacancy_element="Lr"
+                    )
+                else:
+                    cathode = None
+
+                if checkpoint is not None:
+                    (shard, offset) = atoms_position
+                    position = (shard, offset + 1)
+
+                    if cathode is not None:
+                        results.append(cathode.as_dict())
+                    if len(results) == CHECKPOINT_CHUNK_SIZE:
+                        checkpoint.save(results, position)
+                        results = []
+
+                if cathode is not None:
+                    number_of_configurations += 1
+                    yield cathode
+            else:
+                finished = True
 
-            if len(configuration_list) == max_configurations:
-                break
+        finally:
+            # Also store the progress in case the enumeration is interrupted or
+            # the generator is closed
+            if checkpoint is not None:
+                checkpoint.save(results, position, finished=finished)
 
-        return configuration_list
+    @classmethod
+    def read_configurations(cls, checkpoint_directory):
+        """
+        Read the configurations stored in the checkpoint directory of a
+        configuration enumeration, without enumerating them again. See
+        iter_cation_configurations().
+
+        Args:
+            checkpoint_directory (str): Checkpoint directory of the enumeration.
+
+        Yields:
+            pybat.core.Cathode: Cathode representing a configuration.
+
+        """
+        for configuration in EnumerationCheckpoint(
+                checkpoint_directory).iter_results():
+            yield cls.from_dict(configuration)
 
     def as_ordered_structure(self):
         """
@@ -583,9 +1826,14 @@ class Cathode(Structure):
 
         """
 
+        if "occupied_indices" not in self._structure_cache:
+            self._structure_cache["occupied_indices"] = np.flatnonzero(
+                self._occupancies != 0
+            )
+
         return Structure.from_sites(
-            [site for site in self.sites
-             if site.species_and_occu != Composition()]
+            [self._sites[index]
+             for index in self._structure_cache["occupied_indices"]]
         )
 
     def to(self, fmt=None, filename=None, **kwargs):
@@ -629,6 +1877,69 @@ class Cathode(Structure):
 
         return cls.from_sites(structure.sites)
 
+    @classmethod
+    def from_atoms_arrays(cls, cell, numbers, positions, magmom=None,
+                          vacancy_element="Lr"):
+        """
+        Initializes a Cathode directly from the arrays of an ASE Atoms object,
+        e.g. a configuration generated by the icet structure enumeration,
+        without constructing any intermediate pymatgen Structures. The sites are
+        sorted in the same way as by Structure.get_sorted_structure(), i.e. by
+        electronegativity and species string, and the sites occupied by the
+        vacancy placeholder element are turned into vacancies.
+
+        Args:
+            cell (numpy.ndarray): (3, 3) array of the lattice vectors.
+            numbers (numpy.ndarray): Atomic numbers of the sites.
+            positions (numpy.ndarray): (N, 3) array of the cartesian coordinates
+                of the sites.
+            magmom (list): Magnetic moments of the sites, before sorting. These
+                are set to zero for the vacancies. Defaults to zero for all
+                sites.
+            vacancy_element (str): Element which is used as a placeholder for
+                the vacancies.
+
+        Returns:
+            pybat.core.Cathode
+
+        """
+        numbers = np.asarray(numbers, dtype=int)
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+
+        if magmom is None:
+            magmom = np.zeros(len(numbers))
+        else:
+            magmom = np.array(magmom, dtype=float)
+
+        # Rank the elements in the same way as pymatgen sorts the sites, so the
+        # sites can be sorted with a single stable argsort
+        (elements, element_indices) = np.unique(numbers, return_inverse=True)
+        symbols = [chemical_symbols[number] for number in elements]
+
+        element_order = sorted(range(len(symbols)),
+                               key=lambda i: (Element(symbols[i]).X, symbols[i]))
+        element_ranks = np.empty(len(symbols), dtype=int)
+        element_ranks[element_order] = np.arange(len(symbols))
+
+        site_order = np.argsort(element_ranks[element_indices], kind="stable")
+        element_indices = element_indices[site_order]
+
+        element_species = [Composition() if symbol == vacancy_element
+                           else symbol for symbol in symbols]
+        is_vacancy = np.array([symbol == vacancy_element
+                               for symbol in symbols], dtype=bool)
+
+        magmom = magmom[site_order]
+        magmom[is_vacancy[element_indices]] = 0
+
+        return cls(
+            lattice=cell,
+            species=[element_species[index] for index in element_indices],
+            coords=positions[site_order],
+            coords_are_cartesian=True,
+            site_properties={"magmom": magmom.tolist()}
+        )
+
 
 class LiRichCathode(Cathode):
     """
@@ -656,15 +1967,26 @@ class LiRichCathode(Cathode):
 
     def find_oxygen_dimers(self, site_index=None, oxygen_angle_tol=None):
         """
-        Returns a list of index pairs corresponding to the oxygen dimers that
-        can be formed around the site provided by the user, i.e. with oxygens
-        that are neighbours of the provided site.
+        Returns the index pairs corresponding to the oxygen dimers that can be
+        formed around the site provided by the user, i.e. with oxygens that are
+        neighbours of the provided site and are not on opposite sides of its
+        octahedron.
+
+        In case no site index is provided, the dimers around all sites which do
+        not correspond to an oxygen are determined at once.
 
         Args:
-            site_index:
-            oxygen_angle_tol:
+            site_index (int): Index of the site around which the dimers should
+                be found.
+            oxygen_angle_tol (float): Angle between the vectors connecting the
+                site and two oxygens above which the oxygens are considered to
+                be opposites. Defaults to LiRichCathode.oxygen_angle_tol.
 
         Returns:
+            (list): List of index tuples in case a site index is provided.
+                Otherwise, an (N, 2) array of the index pairs of all oxygen
+                dimers in the structure, with the lowest index first and
+                without duplicates.
 
         """
 
@@ -673,93 +1995,121 @@ class LiRichCathode(Cathode):
 
         if site_index is None:
 
-            # TODO This is a lazy way of dealing with this...
-            # Just using the method for single indices and then filtering
-            # duplicates is probably not the fastest implementation. But it
-            # sure is the fastest to implement :P
+            cation_indices = np.flatnonzero(self._species_strings != "O")
 
-            oxygen_dimers = set()
-
-            cation_indices = [
-                index for index in range(len(self.sites))
-                if not self.sites[index].species_string == "O"
-            ]
+            (_, oxygen_pairs) = self._find_oxygen_pairs(cation_indices,
+                                                        oxygen_angle_tol)
 
-            for index in cation_indices:
-                for dimer in self.find_oxygen_dimers(index):
-                    oxygen_dimers.add(dimer)
+            if len(oxygen_pairs) == 0:
+                return np.zeros((0, 2), dtype=int)
 
-            return list(oxygen_dimers)
+            return np.unique(np.sort(oxygen_pairs, axis=1), axis=0)
 
         else:
 
-            # Determine the oxygen neighbors for the provided site
-            oxygen_neighbors_indices = [
-                neighbor["index"] for neighbor
-                in self.voronoi.neighbors(site_index, VORONOI_DIST_FACTOR,
-                                          VORONOI_ANG_FACTOR)
-                if self.sites[neighbor["index"]].species_string == "O"
-            ]
+            (_, oxygen_pairs) = self._find_oxygen_pairs([site_index, ],
+                                                        oxygen_angle_tol)
 
-            # pdb.set_trace()
+            return [tuple(pair) for pair in oxygen_pairs.tolist()]
 
-            if len(oxygen_neighbors_indices) <= 1:
-                raise ValueError("Provided site does not have two oxygen "
-                                 "neighbours.\n")
+    def _find_oxygen_pairs(self, site_indices, oxygen_angle_tol):
+        """
+        Find the pairs of oxygen neighbors of a set of sites which can form a
+        dimer, i.e. which are not on opposite sides of the site's octahedron.
+        The angles of all oxygen pairs around all sites are calculated at once.
 
-            # Find all oxygen neighbour combinations that can form dimers. This
-            # means they are not opposites on the site's octahedron environment.
-            oxygen_dimers = []
-            oxygen_combinations = itertools.combinations(
-                oxygen_neighbors_indices, 2
-            )
+        Args:
+            site_indices (list): Indices of the sites.
+            oxygen_angle_tol (float): Angle tolerance, see find_oxygen_dimers().
+
+        Returns:
+            (tuple): Array with the index of the site each oxygen pair belongs
+                to, and (N, 2) array of the oxygen pairs. The pairs of each site
+                are in the order of its neighbors.
+
+        """
+        site_indices = np.array(site_indices, dtype=int).reshape(-1)
+
+        # Determine the oxygen neighbors for the provided sites from the
+        # neighbor graph. The oxygen neighbors of each site are stored in a row
+        # of an array padded with -1.
+        graph = self.get_neighbor_graph(site_indices)
+        (rows, edges) = graph.get_edges(site_indices)
+
+        neighbors = graph.indices[edges]
+        is_oxygen = self._species_strings[neighbors] == "O"
+        (rows, neighbors) = (rows[is_oxygen], neighbors[is_oxygen])
+
+        number_of_oxygens = np.bincount(rows, minlength=len(site_indices))
+
+        if np.any(number_of_oxygens <= 1):
+            raise ValueError("Provided site does not have two oxygen "
+                             "neighbours.\n")
+
+        columns = np.arange(len(rows)) - np.repeat(
+            np.cumsum(number_of_oxygens) - number_of_oxygens, number_of_oxygens
+        )
+        padded_neighbors = np.full(
+            (len(site_indices), number_of_oxygens.max()), -1, dtype=int
+        )
+        padded_neighbors[rows, columns] = neighbors
+
+        # Vectors connecting each site with the closest image of its oxygens
+        frac_coords = self._get_frac_coords()
 
-            for oxygen_pair in oxygen_combinations:
+        vectors = np.zeros(padded_neighbors.shape + (3,))
+        (vectors[rows, columns], _) = get_minimum_image_vectors(
+            self.lattice, frac_coords[site_indices[rows]],
+            frac_coords[padded_neighbors[rows, columns]]
+        )
 
-                site = self.sites[site_index]
-                oxygen_site_a = self.sites[oxygen_pair[0]]
-                oxygen_site_b = self.sites[oxygen_pair[1]]
+        # Find all oxygen neighbour combinations that can form dimers. This
+        # means they are not opposites on the site's octahedron environment.
+        (index_a, index_b) = np.triu_indices(padded_neighbors.shape[1], k=1)
 
-                oxygen_image_a = site.distance_and_image(oxygen_site_a)[1]
-                oxygen_image_b = site.distance_and_image(oxygen_site_b)[1]
+        vectors_a = vectors[:, index_a]
+        vectors_b = vectors[:, index_b]
 
-                image_a_cart_coords = oxygen_site_a.coords + np.dot(oxygen_image_a,
-                                                                    self.lattice.matrix)
-                image_b_cart_coords = oxygen_site_b.coords + np.dot(oxygen_image_b,
-                                                                    self.lattice.matrix)
+        with np.errstate(invalid="ignore"):
+            cosines = np.sum(vectors_a * vectors_b, axis=2) \
+                / np.linalg.norm(vectors_a, axis=2) \
+                / np.linalg.norm(vectors_b, axis=2)
+        angles = np.arccos(np.clip(cosines, -1, 1))
 
-                oxygen_vector_a = image_a_cart_coords - site.coords
-                oxygen_vector_b = image_b_cart_coords - site.coords
+        is_dimer = (padded_neighbors[:, index_b] >= 0) \
+            & (angles < oxygen_angle_tol)
 
-                if angle_between(oxygen_vector_a, oxygen_vector_b) < \
-                        oxygen_angle_tol:
-                    oxygen_dimers.append(oxygen_pair)
+        if np.any(np.sum(is_dimer, axis=1) > 12):
+            raise Warning(
+                "Found more than 12 oxygen pairs around a single "
+                "site. This can be caused by the use of a small "
+                "unit cell. Results may not be useful.")
 
-            if len(oxygen_dimers) > 12:
-                raise Warning(
-                    "Found more than 12 oxygen pairs around a single "
-                    "site. This can be caused by the use of a small "
-                    "unit cell. Results may not be useful.")
+        (rows, pairs) = np.nonzero(is_dimer)
 
-            return oxygen_dimers
+        return site_indices[rows], np.stack(
+            [padded_neighbors[rows, index_a[pairs]],
+             padded_neighbors[rows, index_b[pairs]]], axis=1
+        ).reshape(-1, 2)
 
     def remove_dimer_cations(self, dimer_indices):
         """
+        Remove the working ions in the environment of a dimer, i.e. the
+        working ions which neighbor one of the oxygens of the dimer.
 
         Args:
-            dimer_indices:
-
-        Returns:
+            dimer_indices (tuple): Indices of the oxygen sites of the dimer.
 
         """
 
-        # Find the sites of the dimer environment
-        dimer_environment = Dimer(self, dimer_indices).sites
-
-        remove_sites = [site for site in dimer_environment
-                        if site.species_string in Cathode.standard_anions]
+        # Find the working ions in the dimer environment
+        environment_indices = np.array(
+            Dimer(self, dimer_indices).environment_indices
+        )
 
-        self.remove_working_ions(remove_sites)
+        self.remove_working_ions(np.unique(
+            environment_indices[self.working_ion_mask[environment_indices]]
+        ))
 
     def find_noneq_dimers(self, site_index=None, method="symmops"):
         """
@@ -780,135 +2130,138 @@ class LiRichCathode(Cathode):
 
             "representation" - Two dimers are equivalent if their
             environments are the same, i.e. when they have the same
-            representation.
+            canonical key. This method also finds chemically equivalent
+            dimers in cells with little or no symmetry.
 
         Returns:
             List of Tuples with the dimer indices
 
         """
 
-        ineq_dimers = []
-
         if method == "symmops":
 
-            symmops = SpacegroupAnalyzer(self).get_space_group_operations()
-
             # If no site is provided, consider all inequivalent cation sites
             if site_index is None:
-
-                ineq_cations = self.find_noneq_cations()
-
-                for index in ineq_cations:
-
-                    site_dimers = self.find_oxygen_dimers(index)
-
-                    for dimer in site_dimers:
-
-                        d1 = [self.sites[dimer[0]], self.sites[dimer[1]]]
-
-                        inequivalent = True
-
-                        for ineq_dimer in ineq_dimers:
-
-                            d2 = [self.sites[ineq_dimer[0]],
-                                  self.sites[ineq_dimer[1]]]
-
-                            if symmops.are_symmetrically_equivalent(d1, d2):
-                                inequivalent = False
-
-                        if inequivalent:
-                            ineq_dimers.append(dimer)
+                dimers = [dimer for index in self.find_noneq_cations()
+                          for dimer in self.find_oxygen_dimers(index)]
 
             # Else only consider the site provided
             else:
-                site_dimers = self.find_oxygen_dimers(site_index)
-
-                for dimer in site_dimers:
+                dimers = self.find_oxygen_dimers(site_index)
 
-                    d1 = [self.sites[dimer[0]], self.sites[dimer[1]]]
+            # Equivalent dimers have the same orbit key, so the first dimer
+            # with each key is taken as its non-equivalent representative.
+            orbit_keys = self.get_symmetry_context().get_orbit_keys(dimers)
+            (_, first_indices) = np.unique(orbit_keys, return_index=True)
 
-                    inequivalent = True
+            return [dimers[index] for index in np.sort(first_indices)]
 
-                    for ineq_dimer in ineq_dimers:
+        elif method == "representation":
 
-                        d2 = [self.sites[ineq_dimer[0]],
-                              self.sites[ineq_dimer[1]]]
+            # If no site is provided, consider all dimers in the structure
+            if site_index is None:
+                dimers = [tuple(dimer) for dimer
+                          in self.find_oxygen_dimers().tolist()]
 
-                        if symmops.are_symmetrically_equivalent(d1, d2):
-                            inequivalent = False
+            # Else only consider the site provided
+            else:
+                dimers = self.find_oxygen_dimers(site_index)
 
-                    if inequivalent:
-                        ineq_dimers.append(dimer)
+            # Bucket the dimers on the canonical key of their environment,
+            # keeping the first dimer of each bucket.
+            noneq_dimers = collections.OrderedDict()
 
-            return ineq_dimers
+            for (dimer, key) in zip(dimers,
+                                    DimerSet(self, dimers).canonical_keys):
+                noneq_dimers.setdefault(key, dimer)
 
-        elif method == "representation":
-            # TODO update this method
-
-            raise NotImplementedError()
-
-            # if site_index is None:
-            #
-            #     ignore = set(CATIONS).union(("O",))
-            #
-            #     transition_metal_indices = [index for index in
-            #                                 range(len(self.sites))
-            #                                 if self.sites[index].species_string
-            #                                 not in ignore]
-            #
-            #     for index in transition_metal_indices:
-            #
-            #         dimers = [Dimer(self, dimer_indices) for dimer_indices
-            #                   in self.find_oxygen_dimers(index)]
-            #
-            #         for dimer in dimers:
-            #             if dimer not in noneq_dimers:
-            #                 noneq_dimers.append(dimer)
-            #
-            # else:
-            #
-            #     dimers = [Dimer(self, dimer_indices) for dimer_indices
-            #               in self.find_oxygen_dimers(site_index)]
-            #
-            #     for dimer in dimers:
-            #         if dimer not in noneq_dimers:
-            #             noneq_dimers.append(dimer)
-            #
-            # return noneq_dimers
+            return list(noneq_dimers.values())
 
         else:
             raise IOError("Method for finding non-equivalent dimers is not "
                           "recognized.")
 
-    def list_noneq_dimers(self):
+    def list_noneq_dimers(self, return_multiplicities=False,
+                          return_central_dimers=False):
         """
         Create a list of lists of equivalent dimers of the various
         non-equivalent dimers, i.e. group all dimers in the structure in
-        lists of dimers that are equivalent to each other.
+        lists of dimers that are equivalent to each other. The dimers are
+        classified in a single pass based on their orbit keys.
+
+        Args:
+            return_multiplicities (bool): Also return the number of dimers in
+                each list.
+            return_central_dimers (bool): Also return the dimer closest to the
+                center of the cell for each list, e.g. for visualization
+                purposes.
 
         Returns:
+            (list): List of lists of dimer index tuples. In case
+                return_multiplicities or return_central_dimers is True, a tuple
+                of the list of dimer lists followed by the list of
+                multiplicities and/or the list of central dimers.
 
         """
+        dimer_array = self.find_oxygen_dimers()
+        dimers = [tuple(dimer) for dimer in dimer_array.tolist()]
+
+        orbit_keys = self.get_symmetry_context().get_orbit_keys(dimer_array)
+        (_, first_indices, classes) = np.unique(
+            orbit_keys, return_index=True, return_inverse=True
+        )
+        classes = classes.ravel()
+
+        # Order the classes by the first dimer that belongs to them
+        class_ranks = np.argsort(np.argsort(first_indices))[classes]
+        members = np.argsort(class_ranks, kind="stable")
+        boundaries = np.cumsum(np.bincount(class_ranks))[:-1]
 
-        symmops = SpacegroupAnalyzer(self).get_space_group_operations()
+        noneq_dimer_lists = [[dimers[index] for index in class_members]
+                             for class_members in np.split(members, boundaries)]
 
-        dimers = self.find_oxygen_dimers()
+        results = [noneq_dimer_lists, ]
+
+        if return_multiplicities:
+            results.append([len(dimer_list) for dimer_list
+                            in noneq_dimer_lists])
+
+        if return_central_dimers:
+            cell_center = np.sum(self.lattice.matrix, 0) / 2
+            distances = np.linalg.norm(
+                self.get_dimer_centers(dimer_array) - cell_center, axis=1
+            )
+            central_indices = np.lexsort((distances, class_ranks))[
+                np.concatenate(([0], boundaries))
+            ]
+            results.append([dimers[index] for index in central_indices])
 
-        noneq_dimer_lists = [[dimer, ] for dimer in self.find_noneq_dimers()]
+        if len(results) == 1:
+            return noneq_dimer_lists
+        else:
+            return tuple(results)
 
-        for dimer in dimers:
+    def get_dimer_centers(self, dimers):
+        """
+        Calculate the centers of a set of dimers, i.e. the midpoints between
+        the first oxygen of each dimer and the closest image of the second.
 
-            d1 = [self.sites[dimer[0]], self.sites[dimer[1]]]
+        Args:
+            dimers (list): List of dimer index tuples.
 
-            for noneq_dimer_list in noneq_dimer_lists:
+        Returns:
+            (numpy.ndarray): (M, 3) array of cartesian coordinates.
 
-                d2 = [self.sites[noneq_dimer_list[0][0]],
-                      self.sites[noneq_dimer_list[0][1]]]
+        """
+        dimers = np.array(dimers, dtype=int).reshape(-1, 2)
+        frac_coords = self._get_frac_coords()
 
-                if symmops.are_symmetrically_equivalent(d1, d2):
-                    noneq_dimer_list.append(dimer)
+        (vectors, _) = get_minimum_image_vectors(
+            self.lattice, frac_coords[dimers[:, 0]], frac_coords[dimers[:, 1]]
+        )
 
-        return noneq_dimer_lists
+        return np.dot(frac_coords[dimers[:, 0]], self.lattice.matrix) \
+            + vectors / 2
 
 
 # TODO Currently the whole dimer representation only works for the O-O
@@ -943,29 +2296,64 @@ class Dimer(MSONable):
         self._cathode = cathode
         self._indices = tuple(dimer_indices)
         self._sites = list
+        self._environment_indices = None
         self._center = None
         self._representation = list
+        self._canonical_key = None
+        self._environment_coords = None
 
     def __eq__(self, other):
         """
-        Checks if the dimer environments of two dimers are the same.
-
+        Checks if the dimer environments of two dimers are the same, i.e. if
+        they have the same canonical key.
 
         Args:
-            other:
+            other (pybat.core.Dimer): Dimer to compare with.
 
         Returns:
+            (bool): True if the dimer environments are the same.
+
+        """
+        if not isinstance(other, Dimer):
+            return False
+
+        return self.canonical_key == other.canonical_key
+
+    def __hash__(self):
+        return hash(self.canonical_key)
 
+    @property
+    def canonical_key(self):
         """
-        is_equal = False
+        Canonical key of the dimer environment, which is the same for all
+        dimers whose representations are related by one of the
+        SYMMETRY_PERMUTATIONS. The species of the representation are encoded
+        with get_species_code(), and the key is the lexicographic minimum of
+        the encoded representation over all permutations. Partially occupied
+        or mixed sites and species with an oxidation state or spin are
+        distinguished by their species and occupancies.
 
-        for permutation in SYMMETRY_PERMUTATIONS:
+        """
+        if self._canonical_key is None:
+
+            compositions = [self.representation[index]
+                            for index in range(1, 13)]
+            codes = [get_species_code(composition)
+                     for composition in compositions]
+            labels = [
+                ", ".join("{}:{}".format(species, occupancy) for
+                          (species, occupancy) in sorted(composition.items()))
+                if code == -1 else ""
+                for code, composition in zip(codes, compositions)
+            ]
 
-            if [self.representation[index] for index in range(1, 13)] == \
-                    [other.representation[key] for key in permutation]:
-                is_equal = True
+            self._canonical_key = min(
+                (tuple(codes[key - 1] for key in permutation),
+                 tuple(labels[key - 1] for key in permutation))
+                for permutation in SYMMETRY_PERMUTATIONS
+            )
 
-        return is_equal
+        return self._canonical_key
 
     @property
     def cathode(self):
@@ -976,46 +2364,45 @@ class Dimer(MSONable):
         return self._indices
 
     @property
-    def sites(self):
+    def environment_indices(self):
+        """
+        Indices of the sites in the environment of the dimer, i.e. the oxygen
+        indices first, followed by the indices of the shared neighbors of the
+        oxygens and finally the other neighbors.
 
-        if self._sites is list:
-            # Find the oxygen neighbours
-            oxygen_a_neighbors = [
-                neighbor["index"] for neighbor
-                in self.cathode.voronoi.neighbors(self.indices[0],
-                                                  VORONOI_DIST_FACTOR,
-                                                  VORONOI_ANG_FACTOR)
-            ]
-            oxygen_b_neighbors = [
-                neighbor["index"] for neighbor
-                in self.cathode.voronoi.neighbors(self.indices[1],
-                                                  VORONOI_DIST_FACTOR,
-                                                  VORONOI_ANG_FACTOR)
-            ]
+        """
+        if self._environment_indices is None:
+
+            # Find the oxygen neighbours from the neighbor graph
+            graph = self.cathode.get_neighbor_graph(self.indices)
 
-            # Determine the indices of the oxygen environment. The indices are
-            # sorted in such a way that the oxygen indices come first,
-            # followed by the indices of the shared neighbors.
-            # TODO This can be done better. Really.
             # TODO Fix issue for small unit cells
             # The issue for small unit cells is that the oxygen atoms have
             # more shared neighbors than two according to the voronoi
             # decomposition, which messes up the assignment of the
             # environment atoms in the representation. This needs to be fixed.
-            shared_neighbors = tuple(
-                set(oxygen_a_neighbors).intersection(oxygen_b_neighbors)
+            shared_neighbors = graph.get_shared_neighbors(*self.indices)
+            other_neighbors = np.setdiff1d(
+                np.union1d(graph.get_neighbors(self.indices[0]),
+                           graph.get_neighbors(self.indices[1])),
+                shared_neighbors[:2]
+            )
+
+            self._environment_indices = tuple(
+                int(index) for index in np.concatenate(
+                    (self.indices, shared_neighbors, other_neighbors)
+                )
             )
-            other_neighbors = set(oxygen_a_neighbors).union(oxygen_b_neighbors)
-            other_neighbors.remove(shared_neighbors[0])
-            other_neighbors.remove(shared_neighbors[1])
-            other_neighbors = tuple(other_neighbors)
 
-            dimer_environment_indices = self._indices + shared_neighbors \
-                                        + other_neighbors
+        return self._environment_indices
+
+    @property
+    def sites(self):
 
-            # Recover the corresponding sites
+        if self._sites is list:
+            # Recover the sites of the dimer environment
             self._sites = [self.cathode.sites[index] for index
-                           in dimer_environment_indices]
+                           in self.environment_indices]
 
         return self._sites
 
@@ -1040,6 +2427,32 @@ class Dimer(MSONable):
 
         return self._center
 
+    @property
+    def environment_coords(self):
+        """
+        Cartesian coordinates of the sites in the dimer environment, in the
+        order of environment_indices. For each site, the periodic image closest
+        to the center of the dimer is used.
+
+        """
+        if self._environment_coords is None:
+
+            indices = np.array(self.environment_indices)
+            frac_coords = self.cathode.lattice.get_fractional_coords(
+                self.center
+            )
+
+            (vectors, _) = get_minimum_image_vectors(
+                self.cathode.lattice,
+                np.tile(frac_coords, (len(indices), 1)),
+                self.cathode._get_frac_coords()[indices]
+            )
+
+            self._environment_coords = self.center + vectors
+            self._environment_coords.flags.writeable = False
+
+        return self._environment_coords
+
     @property
     def representation(self):
         if self._representation is list:
@@ -1057,74 +2470,58 @@ class Dimer(MSONable):
             # correspond to the shared neighbours. This convention is made to
             # save us some work here.
 
-            dimer_molecule = self.get_dimer_molecule()
-
-            oxy_1 = dimer_molecule.sites[0]
-            oxy_2 = dimer_molecule.sites[1]
+            coords = self.environment_coords
+            species = [site.species for site in self.sites]
 
-            shared_neighbor_3 = dimer_molecule.sites[2]
-            shared_neighbor_4 = dimer_molecule.sites[3]
+            (oxy_1, oxy_2, shared_neighbor_3, shared_neighbor_4) = coords[:4]
+            other_coords = coords[4:]
 
             # The representation is defined as a dictionary between site
             # numbers and dimer environment sites
-            representation = {1: oxy_1.species_and_occu,
-                              2: oxy_2.species_and_occu,
-                              3: shared_neighbor_3.species_and_occu,
-                              4: shared_neighbor_4.species_and_occu}
-
-            # TODO Find a cleaner way of assigning representation positions
-
-            # Loop over the remaining sites to find their representation
-            # positions
-            for site in dimer_molecule.sites[4:]:
-
-                # Find the sites which are in the plane of the oxygens and
-                # their shared neighbors.
-                if np.linalg.norm(
-                        oxy_1.coords - (shared_neighbor_4.coords - oxy_1.coords)
-                        - site.coords) < REPRESENTATION_DIST_TOL:
-                    representation[5] = site.species_and_occu
-
-                if np.linalg.norm(
-                        oxy_1.coords - (shared_neighbor_3.coords - oxy_1.coords)
-                        - site.coords) < REPRESENTATION_DIST_TOL:
-                    representation[6] = site.species_and_occu
-
-                if np.linalg.norm(
-                        oxy_2.coords - (shared_neighbor_4.coords - oxy_2.coords)
-                        - site.coords) < REPRESENTATION_DIST_TOL:
-                    representation[7] = site.species_and_occu
-
-                if np.linalg.norm(
-                        oxy_2.coords - (shared_neighbor_3.coords - oxy_2.coords)
-                        - site.coords) < REPRESENTATION_DIST_TOL:
-                    representation[8] = site.species_and_occu
-
-                # Find the sites which are out of plane
-                oxy_1_oop = np.cross(
-                    shared_neighbor_4.coords - oxy_1.coords,
-                    shared_neighbor_3.coords - oxy_1.coords
-                )
-                oxy_2_oop = np.cross(
-                    shared_neighbor_3.coords - oxy_2.coords,
-                    shared_neighbor_4.coords - oxy_2.coords
-                )
-
-                if angle_between(oxy_1_oop, site.coords - oxy_1.coords) \
-                        < REPRESENTATION_ANGLE_TOL:
-                    representation[9] = site.species_and_occu
-
-                if angle_between(oxy_1_oop, site.coords - oxy_1.coords) \
-                        > math.pi - REPRESENTATION_ANGLE_TOL:
-                    representation[10] = site.species_and_occu
-
-                if angle_between(oxy_2_oop, site.coords - oxy_2.coords) \
-                        < REPRESENTATION_ANGLE_TOL:
-                    representation[11] = site.species_and_occu
-
-                if angle_between(oxy_2_oop, site.coords - oxy_2.coords) \
-                        > math.pi - REPRESENTATION_ANGLE_TOL:
-                    representation[12] = site.species_and_occu
+            representation = {1: species[0],
+                              2: species[1],
+                              3: species[2],
+                              4: species[3]}
+
+            # Find the sites which are in the plane of the oxygens and their
+            # shared neighbors, i.e. opposite of the shared neighbors with
+            # respect to one of the oxygens.
+            in_plane_coords = np.array([
+                2 * oxy_1 - shared_neighbor_4,
+                2 * oxy_1 - shared_neighbor_3,
+                2 * oxy_2 - shared_neighbor_4,
+                2 * oxy_2 - shared_neighbor_3
+            ])
+            in_plane = np.linalg.norm(
+                other_coords[np.newaxis, :, :]
+                - in_plane_coords[:, np.newaxis, :], axis=2
+            ) < REPRESENTATION_DIST_TOL
+
+            # Find the sites which are out of plane, i.e. along the normal of
+            # the plane through one of the oxygens.
+            oxy_1_oop = np.cross(shared_neighbor_4 - oxy_1,
+                                 shared_neighbor_3 - oxy_1)
+            oxy_2_oop = np.cross(shared_neighbor_3 - oxy_2,
+                                 shared_neighbor_4 - oxy_2)
+
+            angles = np.array([
+                _angles_between(oxy_1_oop, other_coords - oxy_1),
+                _angles_between(oxy_2_oop, other_coords - oxy_2)
+            ])
+            out_of_plane = np.array([
+                angles[0] < REPRESENTATION_ANGLE_TOL,
+                angles[0] > math.pi - REPRESENTATION_ANGLE_TOL,
+                angles[1] < REPRESENTATION_ANGLE_TOL,
+                angles[1] > math.pi - REPRESENTATION_ANGLE_TOL
+            ])
+
+            # In case several sites match a position, the last one is used
+            for (position, matches) in zip(
+                    range(5, 13), np.concatenate((in_plane, out_of_plane))):
+
+                if matches.any():
+                    representation[position] = \
+                        species[4 + np.flatnonzero(matches)[-1]]
 
             self._representation = representation
 
@@ -1135,19 +2532,8 @@ class Dimer(MSONable):
 
     def get_dimer_molecule(self):
 
-        molecule_sites = []
-
-        for site in self.sites:
-            (distance, jimage) = site.distance_and_image_from_frac_coords(
-                self.cathode.lattice.get_fractional_coords(self.center))
-
-            image_cart_coords = \
-                site.coords - np.dot(jimage, self.cathode.lattice.matrix)
-
-            molecule_sites.append(Site(site.species_and_occu,
-                                       image_cart_coords))
-
-        return Molecule.from_sites(molecule_sites)
+        return Molecule([site.species for site in self.sites],
+                        self.environment_coords)
 
     def visualize_dimer_environment(self, filename=None):
         """
@@ -1230,6 +2616,182 @@ class Dimer(MSONable):
                    dimer_indices=d["dimer_indices"])
 
 
+class DimerSet(MSONable):
+    """
+    Collection of oxygen dimers in a single cathode structure. The cathode is
+    only stored once, together with an (N, 2) array of the dimer indices.
+
+    """
+
+    def __init__(self, cathode, dimer_indices):
+        """
+        Initialize
+
+        Args:
+            cathode (pybat.core.LiRichCathode): Cathode structure of the dimers.
+            dimer_indices (numpy.ndarray): (N, 2) array of the indices of the
+                oxygen sites of each dimer.
+
+        Returns:
+            pybat.core.DimerSet
+
+        """
+        self._cathode = cathode
+        self._indices = np.array(dimer_indices, dtype=int).reshape(-1, 2)
+        self._indices.flags.writeable = False
+
+        self._dimers = [None, ] * len(self._indices)
+        self._centers = None
+
+    @classmethod
+    def from_cathode(cls, cathode):
+        """
+        Initialize a DimerSet with all the oxygen dimers in a cathode.
+
+        Args:
+            cathode (pybat.core.LiRichCathode): Cathode structure.
+
+        Returns:
+            pybat.core.DimerSet
+
+        """
+        return cls(cathode, cathode.find_oxygen_dimers())
+
+    @property
+    def cathode(self):
+        return self._cathode
+
+    @property
+    def indices(self):
+        return self._indices
+
+    def __len__(self):
+        return len(self._indices)
+
+    def __getitem__(self, item):
+        """
+        Get the Dimer at a position in the set. All dimers share the cathode of
+        the set. A slice returns a DimerSet with the selected dimers, which
+        shares the cathode as well as the dimers that have already been set up.
+
+        """
+        if isinstance(item, slice):
+            dimer_set = DimerSet(self.cathode, self._indices[item])
+            dimer_set._dimers = self._dimers[item]
+            if self._centers is not None:
+                dimer_set._centers = self._centers[item]
+
+            return dimer_set
+
+        if self._dimers[item] is None:
+            self._dimers[item] = Dimer(self.cathode,
+                                       tuple(self._indices[item].tolist()))
+            if self._centers is not None:
+                self._dimers[item]._center = self._centers[item]
+
+        return self._dimers[item]
+
+    def __iter__(self):
+        for item in range(len(self)):
+            yield self[item]
+
+    @property
+    def centers(self):
+        """
+        (N, 3) array of the centers of the dimers.
+
+        """
+        if self._centers is None:
+            self._centers = self.cathode.get_dimer_centers(self._indices)
+            self._centers.flags.writeable = False
+
+        return self._centers
+
+    @property
+    def representations(self):
+        """
+        List of the representations of the dimers, see
+        Dimer.representation.
+
+        """
+        self._prepare_dimers()
+        return [dimer.representation for dimer in self]
+
+    @property
+    def canonical_keys(self):
+        """
+        List of the canonical keys of the dimers, see Dimer.canonical_key.
+
+        """
+        self._prepare_dimers()
+        return [dimer.canonical_key for dimer in self]
+
+    def _prepare_dimers(self):
+        # Add the neighbors of all oxygens to the neighbor graph at once and
+        # calculate all dimer centers in one go, instead of for each dimer.
+        self.cathode.get_neighbor_graph(np.unique(self._indices))
+
+        for (dimer, center) in zip(self, self.centers):
+            if dimer._center is None:
+                dimer._center = center
+
+    def to(self, fmt="json", filename=None):
+
+        if fmt == "json":
+            if filename:
+                with zopen(filename, "wt", encoding='utf8') as file:
+                    return json.dump(self.as_dict(), file)
+            else:
+                return json.dumps(self.as_dict())
+        else:
+            raise NotImplementedError("Currently only json format is "
+                                      "supported.")
+
+    @classmethod
+    def from_str(cls, input_string, fmt="json"):
+        """
+        Initialize a DimerSet from a string.
+
+        Currently only supports 'json' formats.
+
+        Args:
+            input_string (str): String from which the DimerSet is initialized.
+            fmt (str): Format of the string representation.
+
+        Returns:
+            (*pybat.core.DimerSet*)
+        """
+        if fmt == "json":
+            d = json.loads(input_string)
+            return cls.from_dict(d)
+        else:
+            raise NotImplementedError('Only json format has been '
+                                      'implemented.')
+
+    @classmethod
+    def from_file(cls, filename):
+
+        with zopen(filename) as file:
+            contents = file.read()
+
+        return cls.from_str(contents)
+
+    def as_dict(self):
+
+        d = {"@module": self.__class__.__module__,
+             "@class": self.__class__.__name__,
+             "cathode": self.cathode.as_dict(),
+             "dimer_indices": self._indices.tolist()}
+
+        return d
+
+    @classmethod
+    def from_dict(cls, d):
+
+        return cls(cathode=LiRichCathode.from_dict(d["cathode"]),
+                   dimer_indices=d["dimer_indices"])
+
+
 class DimerNEBAnalysis(NEBAnalysis):
     """
     Subclass of the NEBAnalysis class in order to change the plotting of the
@@ -1413,6 +2975,37 @@ class DimerNEBAnalysis(NEBAnalysis):
         return plt
 
 
+def get_species_code(composition):
+    """
+    Returns a small integer code for the occupation of a site. Empty sites are
+    encoded as 0, sites fully occupied by a single element by the atomic number
+    of that element, and partially occupied or mixed sites as -1. Species with
+    an oxidation state or spin are also encoded as -1, as they can not be
+    distinguished by their atomic number.
+
+    Args:
+        composition (pymatgen.core.Composition): Occupation of the site.
+
+    Returns:
+        (int): Species code of the site.
+
+    """
+    if composition.num_atoms == 0:
+        return 0
+    elif len(composition) == 1 and composition.num_atoms == 1 \
+            and isinstance(list(composition.keys())[0], Element):
+        return list(composition.keys())[0].Z
+    else:
+        return -1
+
+
+def _read_only(array):
+    """ Returns a read-only view of a numpy array. """
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
 # SO Plagiarism
 def unit_vector(vector):
     """ Returns the unit vector of the vector.  """
@@ -1428,6 +3021,16 @@ def angle_between(v1, v2):
     return np.arccos(np.clip(np.dot(v1_u, v2_u), -1.0, 1.0))
 
 
+def _angles_between(vector, vectors):
+    """
+    Returns the angles in radians between 'vector' and each of the rows of
+    'vectors'.
+    """
+    cosines = np.dot(vectors, vector) / np.linalg.norm(vectors, axis=1) \
+        / np.linalg.norm(vector)
+    return np.arccos(np.clip(cosines, -1.0, 1.0))
+
+
 # def rotation_matrix(axis, theta):
 #     """
 #     Return the rotation matrix associated with clockwise rotation about
@@ -0,0 +1,506 @@
+# coding: utf8
+# Copyright (c) Marnik Bercx, University of Antwerp
+# Distributed under the terms of the MIT License
+
+import collections
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+
+from monty.json import MontyEncoder
+
+from spglib import niggli_reduce as spglib_niggli_reduce
+from icet.tools.structure_enumeration import _get_symmetry_operations, \
+    _get_all_labelings, _yield_unique_labelings, _labeling_to_ase_atoms
+from icet.tools.structure_enumeration_support.normal_form_matrices import \
+    yield_reduced_hnfs, get_unique_snfs
+from icet.tools.structure_enumeration_support.labeling_generation import \
+    LabelingGenerator
+
+
+"""
+Enumeration of configurations based on the structure enumeration of icet, split
+in shards that can be enumerated in parallel. Each shard corresponds to a single
+supercell, i.e. a Hermite normal form (HNF) matrix of a certain size. The
+structures are yielded in the same order as
+icet.tools.structure_enumeration.enumerate_structures(). The results of an
+enumeration can be stored in a checkpoint directory as they are generated, so
+an interrupted enumeration can be resumed.
+
+"""
+
+__author__ = "Marnik Bercx"
+__copyright__ = "Copyright 2019, Marnik Bercx, University of Antwerp"
+__version__ = "pre-alpha"
+__maintainer__ = "Marnik Bercx"
+__email__ = "marnik.bercx@uantwerpen.be"
+__date__ = "Apr 2019"
+
+CHECKPOINT_FILENAME = "checkpoint.json"
+RESULTS_FILENAME = "configurations_{:04d}.json"
+
+
+class EnumerationContext(object):
+    """
+    Everything that is required to enumerate the configurations of a shard,
+    i.e. the description of the configuration space and the symmetry operations
+    of the parent structure.
+
+    A shard is described by a tuple (size, snf_index, hnf_index), i.e. the size
+    of the supercell, the index of its Smith normal form (SNF) among the unique
+    SNFs of that size and the index of the HNF among the HNFs of the SNF.
+
+    """
+
+    def __init__(self, atoms, chemical_symbols, concentration_restrictions=None,
+                 niggli_reduce=None, symprec=1e-5, position_tolerance=None):
+        """
+        Set up the enumeration. The arguments are the same as the ones of
+        icet.tools.structure_enumeration.enumerate_structures().
+
+        Args:
+            atoms (ase.Atoms): Parent structure.
+            chemical_symbols (list): List of the allowed elements on each site.
+            concentration_restrictions (dict): Dictionary of the allowed
+                concentration range of each element.
+            niggli_reduce (bool): Niggli reduce the supercells. Defaults to
+                True in case the structure is periodic in all directions.
+            symprec (float): Tolerance for the symmetry analysis.
+            position_tolerance (float): Tolerance for comparing positions.
+                Defaults to symprec.
+
+        """
+        if position_tolerance is None:
+            position_tolerance = symprec
+
+        self._cell = np.array(atoms.cell)
+        self._pbc = atoms.pbc
+        self._basis = atoms.get_scaled_positions()
+        self._nsites = len(atoms)
+
+        # Construct descriptor of where species are allowed to be
+        if isinstance(chemical_symbols[0], str):
+            iter_chemical_symbols = [tuple(range(len(chemical_symbols)))] \
+                * self._nsites
+            elements = list(chemical_symbols)
+        elif len(chemical_symbols) == self._nsites:
+            elements = []
+            for site_symbols in chemical_symbols:
+                for element in site_symbols:
+                    if element not in elements:
+                        elements.append(element)
+            iter_chemical_symbols = [
+                tuple(elements.index(element) for element in site_symbols)
+                for site_symbols in chemical_symbols
+            ]
+        else:
+            raise ValueError("chemical_symbols needs to be a list of strings "
+                             "or a list of list of strings.")
+
+        self._elements = elements
+
+        # Adapt concentration restrictions to the element indices
+        if concentration_restrictions:
+            concentrations = {}
+            for element, concentration_range in \
+                    concentration_restrictions.items():
+                if element not in elements:
+                    raise ValueError(str(element) + " found in concentration "
+                                     "restrictions but not in "
+                                     "chemical_symbols.")
+                concentrations[elements.index(element)] = \
+                    tuple(concentration_range)
+        else:
+            concentrations = None
+
+        self._labeling_generator = LabelingGenerator(iter_chemical_symbols,
+                                                     concentrations)
+
+        if niggli_reduce is None:
+            niggli_reduce = (sum(atoms.pbc) == 3)
+        self._niggli_reduce = niggli_reduce
+
+        self._symmetries = _get_symmetry_operations(
+            atoms, symprec=symprec, position_tolerance=position_tolerance
+        )
+
+        self._snfs = {}
+        self._labelings = (None, None)
+
+    @property
+    def elements(self):
+        return self._elements
+
+    def __getstate__(self):
+        # Do not send the cached supercells and labelings to the workers
+        state = self.__dict__.copy()
+        state["_snfs"] = {}
+        state["_labelings"] = (None, None)
+        return state
+
+    def get_snfs(self, size):
+        """
+        Get the unique Smith normal forms of the supercells of a certain size,
+        each of which contains the corresponding HNFs.
+
+        Args:
+            size (int): Size of the supercells.
+
+        Returns:
+            (list): List of SmithNormalForm objects.
+
+        """
+        if size not in self._snfs:
+            hnfs = list(yield_reduced_hnfs(size, self._symmetries, self._pbc))
+            self._snfs[size] = get_unique_snfs(hnfs)
+
+        return self._snfs[size]
+
+    def get_shards(self, sizes):
+        """
+        Get the shards of the enumeration, in the order in which the icet
+        enumeration considers them.
+
+        Args:
+            sizes (list): List of supercell sizes.
+
+        Returns:
+            (list): List of (size, snf_index, hnf_index) tuples.
+
+        """
+        return [(size, snf_index, hnf_index)
+                for size in sizes if size != 0
+                for snf_index, snf in enumerate(self.get_snfs(size))
+                for hnf_index in range(len(snf.hnfs))]
+
+    def enumerate_shard(self, shard):
+        """
+        Enumerate the unique labelings of a shard. The labelings are generated
+        lazily, but the generator relies on the labelings of the SNF of the
+        shard, so it should be consumed before the next shard is enumerated.
+
+        Args:
+            shard (tuple): (size, snf_index, hnf_index) of the shard.
+
+        Returns:
+            (generator): Generator of labelings, i.e. tuples of element
+                indices.
+
+        """
+        (size, snf_index, hnf_index) = shard
+        snf = self.get_snfs(size)[snf_index]
+
+        # The labelings only depend on the SNF, which is shared by consecutive
+        # shards. Only the labelings of the last SNF are kept.
+        if self._labelings[0] != (size, snf_index):
+            self._labelings = (
+                (size, snf_index),
+                _get_all_labelings(snf, self._labeling_generator,
+                                   self._nsites)
+            )
+
+        return _yield_unique_labelings(
+            self._labelings[1], snf, snf.hnfs[hnf_index], self._nsites
+        )
+
+    def get_supercell(self, shard):
+        """
+        Get the HNF and the (Niggli reduced) cell of the supercell of a shard.
+
+        Args:
+            shard (tuple): (size, snf_index, hnf_index) of the shard.
+
+        Returns:
+            (tuple): HermiteNormalForm object and (3, 3) array of the cell.
+
+        """
+        (size, snf_index, hnf_index) = shard
+        hnf = self.get_snfs(size)[snf_index].hnfs[hnf_index]
+
+        new_cell = np.dot(hnf.H.T, self._cell)
+
+        if self._niggli_reduce:
+            try:
+                reduced_cell = spglib_niggli_reduce(new_cell)
+            except ValueError:
+                reduced_cell = None
+            if reduced_cell is not None:
+                new_cell = reduced_cell
+
+        return hnf, new_cell
+
+    def get_atoms(self, shard, labeling):
+        """
+        Convert a labeling of a shard into an ASE Atoms object.
+
+        Args:
+            shard (tuple): (size, snf_index, hnf_index) of the shard.
+            labeling (tuple): Labeling of the supercell.
+
+        Returns:
+            ase.Atoms
+
+        """
+        (hnf, new_cell) = self.get_supercell(shard)
+
+        return _labeling_to_ase_atoms(labeling, hnf, self._cell, new_cell,
+                                      self._basis, self._elements, self._pbc)
+
+
+def enumerate_structures(atoms, sizes, chemical_symbols,
+                         concentration_restrictions=None, processes=None,
+                         niggli_reduce=None, symprec=1e-5,
+                         position_tolerance=None, start=None,
+                         return_positions=False):
+    """
+    Enumerate the derivative structures of a parent structure, distributing the
+    shards of the enumeration over a pool of processes. The structures are
+    yielded in the same order as the serial enumeration of icet, regardless of
+    the number of processes.
+
+    The position of a structure in the enumeration is described by the shard
+    and the offset of its labeling among the unique labelings of the shard,
+    which can be used to resume an interrupted enumeration.
+
+    Args:
+        atoms (ase.Atoms): Parent structure.
+        sizes (list): List of supercell sizes.
+        chemical_symbols (list): List of the allowed elements on each site.
+        concentration_restrictions (dict): Dictionary of the allowed
+            concentration range of each element.
+        processes (int): Number of processes. Defaults to the number of CPUs.
+            For a single process, the enumeration is performed in the current
+            process.
+        niggli_reduce (bool): Niggli reduce the supercells.
+        symprec (float): Tolerance for the symmetry analysis.
+        position_tolerance (float): Tolerance for comparing positions.
+        start (tuple): Position (shard, offset) from which to start the
+            enumeration. Defaults to the start of the first shard.
+        return_positions (bool): Also yield the position of each structure.
+
+    Yields:
+        ase.Atoms: Derivative structure. In case return_positions is True, a
+            tuple of the position (shard, offset) and the derivative structure.
+
+    """
+    context = EnumerationContext(
+        atoms, chemical_symbols,
+        concentration_restrictions=concentration_restrictions,
+        niggli_reduce=niggli_reduce, symprec=symprec,
+        position_tolerance=position_tolerance
+    )
+    shards = context.get_shards(sizes)
+
+    start_offset = 0
+    if start is not None:
+        (start_shard, start_offset) = (tuple(start[0]), int(start[1]))
+        try:
+            shards = shards[shards.index(start_shard):]
+        except ValueError:
+            raise ValueError("Shard " + str(start_shard) + " is not part of "
+                             "the enumeration.")
+
+    for (shard_number, (shard, labelings)) in enumerate(
+            _iter_shard_labelings(context, shards, processes)):
+
+        first_offset = start_offset if shard_number == 0 else 0
+
+        for (offset, labeling) in itertools.islice(enumerate(labelings),
+                                                   first_offset, None):
+            structure = context.get_atoms(shard, labeling)
+
+            if return_positions:
+                yield (shard, offset), structure
+            else:
+                yield structure
+
+
+class EnumerationCheckpoint(object):
+    """
+    Directory in which the results of an enumeration are stored as they are
+    generated, so the enumeration can be resumed in case it is interrupted.
+
+    The results are written in chunks to numbered JSON files, and a checkpoint
+    file keeps track of the number of files and the position (shard, offset) in
+    the enumeration up to which the results have been stored. Every file is
+    first written to a temporary file, so an interrupted write never leaves a
+    partially written file.
+
+    """
+
+    def __init__(self, directory, parameters=None):
+        """
+        Open the checkpoint directory, loading the checkpoint if present.
+
+        Args:
+            directory (str): Path to the checkpoint directory.
+            parameters: Parameters of the enumeration, e.g. the parent
+                structure and configuration space, which must have a
+                reproducible repr(). Used to check that an existing checkpoint
+                belongs to the same enumeration. In case no parameters are
+                provided, the checkpoint is not checked, e.g. when only reading
+                the stored results. Contrary to the disk cache keys, the
+                versions of the libraries are not included, so a checkpoint can
+                be resumed after upgrading them.
+
+        """
+        self._directory = os.path.abspath(directory)
+        self._key = None if parameters is None \
+            else hashlib.sha1(repr(parameters).encode("utf8")).hexdigest()
+
+        self._position = None
+        self._number_of_files = 0
+        self._number_of_results = 0
+        self._finished = False
+
+        checkpoint_file = os.path.join(self._directory, CHECKPOINT_FILENAME)
+
+        if os.path.exists(checkpoint_file):
+            with open(checkpoint_file, "r") as file:
+                checkpoint = json.load(file)
+
+            if self._key is None:
+                self._key = checkpoint["key"]
+            elif checkpoint["key"] != self._key:
+                raise ValueError("The checkpoint in " + self._directory +
+                                 " belongs to a different enumeration.")
+
+            if checkpoint["position"] is not None:
+                (shard, offset) = checkpoint["position"]
+                self._position = (tuple(shard), offset)
+            self._number_of_files = checkpoint["number_of_files"]
+            self._number_of_results = checkpoint["number_of_results"]
+            self._finished = checkpoint["finished"]
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def position(self):
+        """
+        Position (shard, offset) from which the enumeration should be resumed,
+        or None in case the enumeration has not started yet.
+
+        """
+        return self._position
+
+    @property
+    def finished(self):
+        return self._finished
+
+    def __len__(self):
+        return self._number_of_results
+
+    def iter_results(self):
+        """
+        Read the stored results, in the order in which they were generated.
+
+        Yields:
+            Stored result, as loaded from JSON.
+
+        """
+        for file_number in range(self._number_of_files):
+            with open(self._results_path(file_number), "r") as file:
+                for result in json.load(file):
+                    yield result
+
+    def save(self, results, position, finished=False):
+        """
+        Store a new chunk of results and update the checkpoint.
+
+        Args:
+            results (list): List of JSON serializable results, generated since
+                the last checkpoint.
+            position (tuple): Position (shard, offset) from which the
+                enumeration should be resumed.
+            finished (bool): Whether the enumeration is finished.
+
+        """
+        os.makedirs(self._directory, exist_ok=True)
+
+        # Results which are stored in a file beyond the number of files of the
+        # checkpoint were written after the last checkpoint, and are simply
+        # overwritten.
+        if results:
+            _write_json(self._results_path(self._number_of_files), results)
+            self._number_of_files += 1
+            self._number_of_results += len(results)
+
+        self._position = position
+        self._finished = finished
+
+        _write_json(
+            os.path.join(self._directory, CHECKPOINT_FILENAME),
+            {"key": self._key,
+             "position": position,
+             "number_of_files": self._number_of_files,
+             "number_of_results": self._number_of_results,
+             "finished": finished}
+        )
+
+    def _results_path(self, file_number):
+        return os.path.join(self._directory,
+                            RESULTS_FILENAME.format(file_number))
+
+
+def _write_json(path, data):
+    (handle, temp_path) = tempfile.mkstemp(dir=os.path.dirname(path),
+                                           suffix=".tmp")
+    with os.fdopen(handle, "w") as file:
+        json.dump(data, file, cls=MontyEncoder)
+    os.replace(temp_path, path)
+
+
+def _iter_shard_labelings(context, shards, processes):
+    """
+    Enumerate the unique labelings of a list of shards, in the order of the
+    shards. In the current process, the labelings of each shard are generated
+    lazily. In case the shards are distributed over a pool of processes, only a
+    limited number of shards is enumerated ahead of the shard that is being
+    consumed, so the results of the workers do not pile up in case the
+    consumer is slower than the enumeration.
+
+    """
+    if processes == 1:
+        for shard in shards:
+            yield shard, context.enumerate_shard(shard)
+
+    else:
+        max_pending_shards = 2 * (processes or os.cpu_count() or 1)
+        shards = iter(shards)
+
+        with multiprocessing.Pool(processes, initializer=_initialize_worker,
+                                  initargs=(context,)) as pool:
+
+            pending = collections.deque(
+                pool.apply_async(_enumerate_shard, (shard,))
+                for shard in itertools.islice(shards, max_pending_shards)
+            )
+
+            while pending:
+                result = pending.popleft().get()
+
+                for shard in itertools.islice(shards, 1):
+                    pending.append(pool.apply_async(_enumerate_shard,
+                                                    (shard,)))
+
+                yield result
+
+
+# Enumeration context of a worker process
+_worker_context = None
+
+
+def _initialize_worker(context):
+    global _worker_context
+    _worker_context = context
+
+
+def _enumerate_shard(shard):
+    return shard, list(_worker_context.enumerate_shard(shard))
@@ -0,0 +1,801 @@
+# coding: utf8
+# Copyright (c) Marnik Bercx, University of Antwerp
+# Distributed under the terms of the MIT License
+
+import itertools
+
+import numpy as np
+
+from scipy.spatial import cKDTree, Voronoi
+from pymatgen.analysis.chemenv.utils.coordination_geometry_utils import \
+    solid_angle
+
+"""
+Module with tools for quickly finding sites and neighbors in periodic
+structures, without having to loop over all the sites in Python.
+
+"""
+
+__author__ = "Marnik Bercx"
+__copyright__ = "Copyright 2019, Marnik Bercx, University of Antwerp"
+__version__ = "pre-alpha"
+__maintainer__ = "Marnik Bercx"
+__email__ = "marnik.bercx@uantwerpen.be"
+__date__ = "Apr 2019"
+
+# Default tolerance (in Angstrom) for considering two sites to be the same
+SITE_MATCHING_TOL = 5e-2
+
+# Radius of the sphere of sites used to construct the voronoi cell of a site,
+# as well as the tolerances for grouping the normalized distances and angles of
+# the voronoi neighbors. These are the defaults of the pymatgen ChemEnv
+# DetailedVoronoiContainer.
+LOCAL_VORONOI_CUTOFF = 10.0
+VORONOI_DISTANCE_TOL = 1e-5
+VORONOI_ANGLE_TOL = 1e-3
+
+
+class PeriodicSiteIndex(object):
+    """
+    Spatial index over the fractional coordinates of the sites in a periodic
+    lattice, which allows finding the sites that lie within a certain
+    distance of a set of points in roughly constant time per point.
+
+    The fractional coordinates are scaled along each lattice direction so that
+    a sphere with the tolerance as radius fits in a unit box, after which they
+    are stored in a periodic KD-tree. Candidates found in the tree are then
+    checked using their actual cartesian distance.
+
+    """
+
+    def __init__(self, lattice, frac_coords, tol=SITE_MATCHING_TOL):
+        """
+        Initialize the index.
+
+        Args:
+            lattice (pymatgen.core.Lattice): Lattice of the structure.
+            frac_coords (numpy.ndarray): (N, 3) array of fractional coordinates
+                of the sites to be indexed.
+            tol (float): Distance tolerance in Angstrom.
+
+        """
+        self._lattice = lattice
+        self._tol = tol
+
+        # Half-width of the box around a sphere with radius tol, in fractional
+        # coordinates along each lattice vector.
+        reciprocal_lengths = np.linalg.norm(
+            np.linalg.inv(lattice.matrix).T, axis=1
+        )
+        self._scale = 1 / (tol * reciprocal_lengths)
+
+        self._frac_coords = np.array(frac_coords, dtype=float).reshape(-1, 3)
+        self._tree = cKDTree(self._scale_coords(self._frac_coords),
+                             boxsize=self._scale)
+
+    @property
+    def tol(self):
+        return self._tol
+
+    def _scale_coords(self, frac_coords):
+        scaled_coords = np.mod(frac_coords, 1) * self._scale
+        return np.where(scaled_coords < self._scale, scaled_coords, 0)
+
+    def query(self, frac_coords):
+        """
+        Find all the indexed sites that are within the tolerance of the
+        provided points.
+
+        Args:
+            frac_coords (numpy.ndarray): (M, 3) array of fractional coordinates
+                of the points to look for.
+
+        Returns:
+            (tuple): Two integer arrays of equal length. The first contains the
+                indices of the points, the second the indices of the sites
+                they were matched with.
+
+        """
+        frac_coords = np.array(frac_coords, dtype=float).reshape(-1, 3)
+
+        candidates = self._tree.query_ball_point(
+            self._scale_coords(frac_coords), r=1, p=np.inf
+        )
+        point_indices = np.repeat(np.arange(len(frac_coords)),
+                                  [len(c) for c in candidates])
+        site_indices = np.fromiter(
+            (index for c in candidates for index in c), dtype=int,
+            count=len(point_indices)
+        )
+
+        # Check the actual distances to the closest image
+        frac_vectors = self._frac_coords[site_indices] \
+            - frac_coords[point_indices]
+        frac_vectors -= np.round(frac_vectors)
+        distances = np.linalg.norm(
+            np.dot(frac_vectors, self._lattice.matrix), axis=1
+        )
+
+        match = distances < self._tol
+
+        return point_indices[match], site_indices[match]
+
+
+class NeighborGraph(object):
+    """
+    Neighbor graph of the sites in a periodic structure, stored in compressed
+    sparse row (CSR) format: the neighbors of site i are
+    indices[indptr[i]:indptr[i + 1]], with the periodic images and distances
+    of the corresponding edges stored in the same positions of images and
+    distances.
+
+    The graph can also contain the neighbors of only part of the sites, in
+    which case the rows of the other sites are empty.
+
+    """
+
+    def __init__(self, indptr, indices, images, distances, row_mask=None):
+        """
+        Initialize the graph from its CSR arrays.
+
+        Args:
+            indptr (numpy.ndarray): (N + 1,) array of the positions of the
+                first edge of each site.
+            indices (numpy.ndarray): (E,) array of the neighbor indices.
+            images (numpy.ndarray): (E, 3) array of the periodic images of the
+                neighbors.
+            distances (numpy.ndarray): (E,) array of the neighbor distances.
+            row_mask (numpy.ndarray): Boolean array which indicates the sites
+                whose neighbors are included in the graph. Defaults to all
+                sites.
+
+        """
+        self._indptr = np.array(indptr, dtype=int)
+        self._indices = np.array(indices, dtype=int)
+        self._images = np.array(images, dtype=int).reshape(-1, 3)
+        self._distances = np.array(distances, dtype=float)
+
+        if row_mask is None:
+            self._row_mask = np.ones(len(self._indptr) - 1, dtype=bool)
+        else:
+            self._row_mask = np.array(row_mask, dtype=bool)
+
+        for array in (self._indptr, self._indices, self._images,
+                      self._distances, self._row_mask):
+            array.flags.writeable = False
+
+    @classmethod
+    def from_neighbor_lists(cls, neighbor_lists, row_mask=None):
+        """
+        Construct the graph from a list with the neighbors of each site.
+
+        Args:
+            neighbor_lists (list): List of lists of neighbor dictionaries with
+                the "index", "image" and "distance" of each neighbor.
+            row_mask (numpy.ndarray): Boolean array which indicates the sites
+                whose neighbors are included. Defaults to all sites.
+
+        Returns:
+            pybat.neighbors.NeighborGraph
+
+        """
+        indptr = np.concatenate(
+            ([0], np.cumsum([len(neighbors) for neighbors in neighbor_lists]))
+        )
+        edges = [neighbor for neighbors in neighbor_lists
+                 for neighbor in neighbors]
+
+        return cls(
+            indptr=indptr,
+            indices=[neighbor["index"] for neighbor in edges],
+            images=np.round([neighbor["image"] for neighbor in edges]),
+            distances=[neighbor["distance"] for neighbor in edges],
+            row_mask=row_mask
+        )
+
+    @classmethod
+    def empty(cls, number_of_sites):
+        """
+        Construct a graph without the neighbors of any of the sites, which can
+        be extended with add_rows().
+
+        Args:
+            number_of_sites (int): Number of sites in the structure.
+
+        Returns:
+            pybat.neighbors.NeighborGraph
+
+        """
+        return cls(
+            indptr=np.zeros(number_of_sites + 1, dtype=int),
+            indices=np.zeros(0, dtype=int),
+            images=np.zeros((0, 3), dtype=int),
+            distances=np.zeros(0),
+            row_mask=np.zeros(number_of_sites, dtype=bool)
+        )
+
+    def add_rows(self, neighbor_lists):
+        """
+        Construct a new graph which also includes the neighbors of more sites.
+        Only the edges of the new sites are processed, the edges of the sites
+        already in the graph are merged into the new CSR arrays as a whole.
+
+        Args:
+            neighbor_lists (dict): Dictionary which maps the index of each site
+                that is not yet included in the graph onto the list of its
+                neighbor dictionaries, with the "index", "image" and "distance"
+                of each neighbor.
+
+        Returns:
+            pybat.neighbors.NeighborGraph
+
+        """
+        new_sites = np.array(sorted(neighbor_lists), dtype=int)
+
+        if np.any(self._row_mask[new_sites]):
+            raise ValueError("The neighbors of some of the sites are already "
+                             "included in the graph.")
+
+        new_edges = [neighbor for index in new_sites
+                     for neighbor in neighbor_lists[index]]
+        new_edge_sites = np.repeat(
+            new_sites, [len(neighbor_lists[index]) for index in new_sites]
+        )
+        old_edge_sites = np.repeat(np.arange(len(self)),
+                                   np.diff(self._indptr))
+
+        # The new sites have no edges in the graph yet, so sorting all edges
+        # by site keeps the edges of each site in their original order.
+        order = np.argsort(np.concatenate((old_edge_sites, new_edge_sites)),
+                           kind="stable")
+
+        row_mask = self._row_mask.copy()
+        row_mask[new_sites] = True
+
+        return NeighborGraph(
+            indptr=np.concatenate(([0], np.cumsum(np.bincount(
+                np.concatenate((old_edge_sites, new_edge_sites)),
+                minlength=len(self)
+            )))),
+            indices=np.concatenate((
+                self._indices,
+                np.array([neighbor["index"] for neighbor in new_edges],
+                         dtype=int)
+            ))[order],
+            images=np.concatenate((
+                self._images,
+                np.round([neighbor["image"] for neighbor in new_edges]
+                         ).reshape(-1, 3).astype(int)
+            ))[order],
+            distances=np.concatenate((
+                self._distances,
+                np.array([neighbor["distance"] for neighbor in new_edges],
+                         dtype=float)
+            ))[order],
+            row_mask=row_mask
+        )
+
+    @property
+    def indptr(self):
+        return self._indptr
+
+    @property
+    def indices(self):
+        return self._indices
+
+    @property
+    def images(self):
+        return self._images
+
+    @property
+    def distances(self):
+        return self._distances
+
+    @property
+    def row_mask(self):
+        return self._row_mask
+
+    def __len__(self):
+        return len(self._indptr) - 1
+
+    def get_edges(self, site_indices):
+        """
+        Get the positions of the edges of a set of sites in the CSR arrays.
+
+        Args:
+            site_indices (numpy.ndarray): Indices of the sites.
+
+        Returns:
+            (tuple): Array with the position in site_indices of the site each
+                edge belongs to, and the array of the edge positions.
+
+        """
+        site_indices = np.array(site_indices, dtype=int).reshape(-1)
+
+        starts = self._indptr[site_indices]
+        counts = self._indptr[site_indices + 1] - starts
+
+        rows = np.repeat(np.arange(len(site_indices)), counts)
+        edges = np.arange(counts.sum()) \
+            - np.repeat(np.cumsum(counts) - counts, counts) \
+            + np.repeat(starts, counts)
+
+        return rows, edges
+
+    def get_neighbors(self, site_index, mask=None):
+        """
+        Get the indices of the neighbors of a site.
+
+        Args:
+            site_index (int): Index of the site.
+            mask (numpy.ndarray): Boolean array over all sites. If provided,
+                only the neighbors for which the mask is True are returned.
+
+        Returns:
+            (numpy.ndarray): Neighbor indices, in the order of the edges.
+
+        """
+        neighbors = self._indices[self._indptr[site_index]:
+                                  self._indptr[site_index + 1]]
+
+        if mask is not None:
+            neighbors = neighbors[mask[neighbors]]
+
+        return neighbors
+
+    def get_shared_neighbors(self, site_a, site_b, mask=None):
+        """
+        Get the indices of the sites that are neighbors of both sites.
+
+        Args:
+            site_a (int): Index of the first site.
+            site_b (int): Index of the second site.
+            mask (numpy.ndarray): Boolean array over all sites, see
+                get_neighbors().
+
+        Returns:
+            (numpy.ndarray): Sorted array of the shared neighbor indices.
+
+        """
+        return np.intersect1d(self.get_neighbors(site_a, mask),
+                              self.get_neighbors(site_b, mask))
+
+    def get_shell(self, site_indices, k=1, mask=None):
+        """
+        Get the k-shell environment of a set of sites, i.e. all sites that can
+        be reached from the sites in at most k steps over the graph, excluding
+        the sites themselves.
+
+        Args:
+            site_indices (list): Indices of the sites.
+            k (int): Number of neighbor shells.
+            mask (numpy.ndarray): Boolean array over all sites. If provided,
+                only the sites for which the mask is True are returned. The
+                shells are still determined using all sites.
+
+        Returns:
+            (numpy.ndarray): Sorted array of the site indices in the
+                environment.
+
+        """
+        site_indices = np.unique(np.array(site_indices, dtype=int))
+
+        reached = np.zeros(len(self), dtype=bool)
+        reached[site_indices] = True
+        frontier = site_indices
+
+        for _ in range(k):
+            (_, edges) = self.get_edges(frontier)
+            neighbors = np.unique(self._indices[edges])
+            frontier = neighbors[~reached[neighbors]]
+            reached[frontier] = True
+
+        reached[site_indices] = False
+
+        if mask is not None:
+            reached &= mask
+
+        return np.flatnonzero(reached)
+
+
+def find_cutoff_neighbors(lattice, frac_coords, cutoff):
+    """
+    Find all pairs of sites within a cutoff distance of each other in a
+    periodic structure, using a linked-cell search. The sites are distributed
+    over a grid of cells that are at least as wide as the cutoff, so that only
+    the sites in neighboring cells have to be checked.
+
+    Args:
+        lattice (pymatgen.core.Lattice): Lattice of the structure.
+        frac_coords (numpy.ndarray): (N, 3) array of fractional coordinates.
+        cutoff (float): Cutoff distance in Angstrom.
+
+    Returns:
+        (tuple): Arrays of the center indices, neighbor indices, neighbor
+            images and distances of all pairs, sorted by center index. The
+            image is the lattice translation that has to be added to the
+            fractional coordinates of the neighbor.
+
+    """
+    frac_coords = np.array(frac_coords, dtype=float).reshape(-1, 3)
+    matrix = lattice.matrix
+
+    # Work with the coordinates inside the unit cell, but keep track of the
+    # original unit cell of each site to correct the images afterwards.
+    unit_cells = np.floor(frac_coords)
+    frac_coords = frac_coords - unit_cells
+
+    # Set up the cell grid, based on the distances between the lattice planes
+    plane_distances = 1 / np.linalg.norm(np.linalg.inv(matrix).T, axis=1)
+    ncells = np.maximum(np.floor(plane_distances / cutoff), 1).astype(int)
+    cell_range = np.floor(cutoff * ncells / plane_distances).astype(int) + 1
+
+    site_cells = np.minimum(np.floor(frac_coords * ncells).astype(int),
+                            ncells - 1)
+    cell_numbers = np.ravel_multi_index(site_cells.T, ncells)
+
+    # Sort the sites by cell
+    site_order = np.argsort(cell_numbers, kind="stable")
+    cell_counts = np.bincount(cell_numbers, minlength=np.prod(ncells))
+    cell_starts = np.cumsum(cell_counts) - cell_counts
+
+    all_centers = []
+    all_neighbors = []
+    all_images = []
+    all_distances = []
+
+    for offset in itertools.product(*[range(-r, r + 1) for r in cell_range]):
+
+        shifted_cells = site_cells + offset
+        images = np.floor_divide(shifted_cells, ncells)
+        neighbor_cells = np.ravel_multi_index(
+            np.mod(shifted_cells, ncells).T, ncells
+        )
+
+        # Pair every site with all the sites in the neighboring cell
+        counts = cell_counts[neighbor_cells]
+        centers = np.repeat(np.arange(len(frac_coords)), counts)
+        positions = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts
+        )
+        neighbors = site_order[
+            np.repeat(cell_starts[neighbor_cells], counts) + positions
+        ]
+        images = np.repeat(images, counts, axis=0)
+
+        vectors = np.dot(frac_coords[neighbors] + images
+                         - frac_coords[centers], matrix)
+        distances = np.linalg.norm(vectors, axis=1)
+
+        within_cutoff = (distances <= cutoff) & (distances > 0)
+
+        all_centers.append(centers[within_cutoff])
+        all_neighbors.append(neighbors[within_cutoff])
+        all_images.append(images[within_cutoff] - unit_cells[neighbors][within_cutoff]
+                          + unit_cells[centers][within_cutoff])
+        all_distances.append(distances[within_cutoff])
+
+    centers = np.concatenate(all_centers)
+    order = np.argsort(centers, kind="stable")
+
+    return (centers[order], np.concatenate(all_neighbors)[order],
+            np.concatenate(all_images)[order],
+            np.concatenate(all_distances)[order])
+
+
+def find_sites_in_sphere(lattice, frac_coords, center, cutoff):
+    """
+    Find all the sites, including periodic images, within a cutoff distance of
+    a point.
+
+    Args:
+        lattice (pymatgen.core.Lattice): Lattice of the structure.
+        frac_coords (numpy.ndarray): (N, 3) array of fractional coordinates.
+        center (numpy.ndarray): Fractional coordinates of the point.
+        cutoff (float): Cutoff distance in Angstrom.
+
+    Returns:
+        (tuple): Arrays of the site indices, images, distances and cartesian
+            coordinates of all the sites in the sphere.
+
+    """
+    frac_coords = np.array(frac_coords, dtype=float).reshape(-1, 3)
+    center = np.array(center, dtype=float)
+    matrix = lattice.matrix
+
+    unit_cells = np.floor(frac_coords)
+    frac_coords = frac_coords - unit_cells
+
+    # Range of images to consider along each lattice vector
+    frac_cutoffs = cutoff * np.linalg.norm(np.linalg.inv(matrix).T, axis=1)
+    image_ranges = [range(int(np.floor(c - r)) - 1, int(np.ceil(c + r)) + 1)
+                    for c, r in zip(center, frac_cutoffs)]
+    images = np.array(list(itertools.product(*image_ranges)), dtype=float)
+
+    indices = np.repeat(np.arange(len(frac_coords)), len(images))
+    images = np.tile(images, (len(frac_coords), 1))
+
+    coords = np.dot(frac_coords[indices] + images, matrix)
+    distances = np.linalg.norm(coords - np.dot(center, matrix), axis=1)
+
+    in_sphere = distances <= cutoff
+
+    return (indices[in_sphere], images[in_sphere] - unit_cells[indices[in_sphere]],
+            distances[in_sphere], coords[in_sphere])
+
+
+def get_minimum_image_vectors(lattice, frac_coords_a, frac_coords_b):
+    """
+    Determine the shortest vectors between pairs of points in a periodic
+    lattice, i.e. the vectors from each point in frac_coords_a to the closest
+    periodic image of the corresponding point in frac_coords_b.
+
+    Args:
+        lattice (pymatgen.core.Lattice): Lattice of the structure.
+        frac_coords_a (numpy.ndarray): (M, 3) array of fractional coordinates.
+        frac_coords_b (numpy.ndarray): (M, 3) array of fractional coordinates.
+
+    Returns:
+        (tuple): (M, 3) array of cartesian vectors and (M, 3) integer array of
+            the images of the points in frac_coords_b, relative to their
+            provided coordinates.
+
+    """
+    frac_coords_a = np.array(frac_coords_a, dtype=float).reshape(-1, 3)
+    frac_coords_b = np.array(frac_coords_b, dtype=float).reshape(-1, 3)
+
+    frac_vectors = frac_coords_b - frac_coords_a
+    images = -np.round(frac_vectors)
+
+    # Check the neighboring images as well, for skewed lattices
+    offsets = np.array(list(itertools.product((-1, 0, 1), repeat=3)))
+    candidates = np.dot(frac_vectors[:, np.newaxis, :] + images[:, np.newaxis, :]
+                        + offsets[np.newaxis, :, :], lattice.matrix)
+    closest = np.argmin(np.linalg.norm(candidates, axis=2), axis=1)
+
+    rows = np.arange(len(frac_vectors))
+
+    return (candidates[rows, closest],
+            (images + offsets[closest]).astype(int))
+
+
+class VoronoiNeighborTable(object):
+    """
+    Table of the voronoi cells of the sites in a structure. The cells are
+    constructed on demand, one site at a time, and are updated incrementally
+    when sites are moved: only the cells of the moved sites and the sites that
+    share a voronoi facet with them, before or after the move, are
+    reconstructed.
+
+    """
+
+    def __init__(self, cutoff=LOCAL_VORONOI_CUTOFF):
+        """
+        Initialize the table.
+
+        Args:
+            cutoff (float): Radius of the sphere of sites used to construct the
+                voronoi cell of a site.
+
+        """
+        self._cutoff = cutoff
+        self._cells = {}
+        self._moved_sites = set()
+
+    def get_cell(self, lattice, frac_coords, site_index):
+        """
+        Get the voronoi cell of a site, see get_voronoi_cell().
+
+        Args:
+            lattice (pymatgen.core.Lattice): Lattice of the structure.
+            frac_coords (numpy.ndarray): (N, 3) array of the current fractional
+                coordinates of the sites.
+            site_index (int): Index of the site.
+
+        Returns:
+            (list): List of facet dictionaries.
+
+        """
+        if self._moved_sites:
+            self._update_moved_cells(lattice, frac_coords)
+
+        if site_index not in self._cells:
+            self._cells[site_index] = get_voronoi_cell(
+                lattice, frac_coords, site_index, self._cutoff
+            )
+
+        return self._cells[site_index]
+
+    def get_neighbors(self, lattice, frac_coords, site_index, dist_factor,
+                      ang_factor):
+        """
+        Get the neighbors of a site, see get_local_voronoi_neighbors().
+
+        """
+        return select_voronoi_neighbors(
+            self.get_cell(lattice, frac_coords, site_index),
+            dist_factor, ang_factor
+        )
+
+    def move_sites(self, indices):
+        """
+        Register that a set of sites has been moved. The cells of the moved
+        sites and of the sites which had them as a facet neighbor are removed
+        from the table. The cells of the new facet neighbors of the moved sites
+        are removed the next time a cell is requested.
+
+        Args:
+            indices (list): Indices of the moved sites.
+
+        """
+        moved_sites = set(int(index) for index in indices)
+
+        for index in list(self._cells.keys()):
+            if index in moved_sites or moved_sites.intersection(
+                    facet["index"] for facet in self._cells[index]):
+                del self._cells[index]
+
+        self._moved_sites.update(moved_sites)
+
+    def _update_moved_cells(self, lattice, frac_coords):
+        moved_sites = self._moved_sites
+        self._moved_sites = set()
+
+        new_cells = {
+            index: get_voronoi_cell(lattice, frac_coords, index, self._cutoff)
+            for index in moved_sites
+        }
+
+        for cell in new_cells.values():
+            for facet in cell:
+                self._cells.pop(facet["index"], None)
+
+        self._cells.update(new_cells)
+
+
+def get_voronoi_cell(lattice, frac_coords, site_index,
+                     cutoff=LOCAL_VORONOI_CUTOFF):
+    """
+    Construct the voronoi cell of a single site from the sites in a periodic
+    sphere around it.
+
+    Args:
+        lattice (pymatgen.core.Lattice): Lattice of the structure.
+        frac_coords (numpy.ndarray): (N, 3) array of fractional coordinates.
+        site_index (int): Index of the site.
+        cutoff (float): Radius of the sphere of sites used to construct the
+            voronoi cell.
+
+    Returns:
+        (list): List of dictionaries with the "index", "image", "distance",
+            "angle", "normalized_distance" and "normalized_angle" of the
+            neighbor corresponding to each facet of the cell.
+
+    """
+    frac_coords = np.array(frac_coords, dtype=float).reshape(-1, 3)
+    center = frac_coords[site_index]
+
+    (indices, images, distances, coords) = find_sites_in_sphere(
+        lattice, frac_coords, center, cutoff
+    )
+
+    # Put the site itself first
+    order = np.argsort(distances, kind="stable")
+    (indices, images, distances, coords) = (indices[order], images[order],
+                                            distances[order], coords[order])
+
+    voronoi = Voronoi(points=coords, qhull_options="o Fv")
+
+    cell = []
+
+    for ridge_points, ridge_vertices in zip(voronoi.ridge_points,
+                                            voronoi.ridge_vertices):
+        if 0 in ridge_points:
+            if -1 in ridge_vertices:
+                raise RuntimeError("Infinite vertex in the voronoi construction "
+                                   "of site " + str(site_index) + ". Consider "
+                                   "increasing the cutoff.")
+
+            point = max(ridge_points)
+            cell.append({
+                "index": int(indices[point]),
+                "image": images[point],
+                "distance": distances[point],
+                "angle": solid_angle(coords[0],
+                                     voronoi.vertices[ridge_vertices])
+            })
+
+    min_distance = min(facet["distance"] for facet in cell)
+    max_angle = max(facet["angle"] for facet in cell)
+
+    for facet in cell:
+        facet["normalized_distance"] = facet["distance"] / min_distance
+        facet["normalized_angle"] = facet["angle"] / max_angle
+
+    return cell
+
+
+def select_voronoi_neighbors(cell, dist_factor, ang_factor):
+    """
+    Select the neighbors from the facets of a voronoi cell in the same way as
+    the neighbors() method of the pymatgen ChemEnv DetailedVoronoiContainer,
+    i.e. based on the normalized distance and solid angle of each facet.
+
+    Args:
+        cell (list): List of facet dictionaries, see get_voronoi_cell().
+        dist_factor (float): Maximum normalized distance of the neighbors.
+        ang_factor (float): Minimum normalized solid angle of the neighbors.
+
+    Returns:
+        (list): List of the facet dictionaries of the neighbors.
+
+    """
+    distance_limit = _get_factor_limit(
+        [facet["normalized_distance"] for facet in cell],
+        dist_factor, VORONOI_DISTANCE_TOL
+    )
+    angle_limit = -_get_factor_limit(
+        [-facet["normalized_angle"] for facet in cell],
+        -ang_factor, VORONOI_ANGLE_TOL
+    )
+
+    return [facet for facet in cell
+            if facet["normalized_distance"] <= distance_limit
+            and facet["normalized_angle"] >= angle_limit]
+
+
+def get_local_voronoi_neighbors(lattice, frac_coords, site_index, dist_factor,
+                                ang_factor, cutoff=LOCAL_VORONOI_CUTOFF):
+    """
+    Determine the neighbors of a single site from the voronoi cell of that
+    site only, which is constructed from the sites in a periodic sphere around
+    it. The neighbors are the same as the ones found by the neighbors() method
+    of the pymatgen ChemEnv DetailedVoronoiContainer.
+
+    Args:
+        lattice (pymatgen.core.Lattice): Lattice of the structure.
+        frac_coords (numpy.ndarray): (N, 3) array of fractional coordinates.
+        site_index (int): Index of the site.
+        dist_factor (float): Maximum normalized distance of the neighbors.
+        ang_factor (float): Minimum normalized solid angle of the neighbors.
+        cutoff (float): Radius of the sphere of sites used to construct the
+            voronoi cell.
+
+    Returns:
+        (list): List of neighbor dictionaries with the "index", "image",
+            "distance", "angle", "normalized_distance" and "normalized_angle"
+            of each neighbor.
+
+    """
+    return select_voronoi_neighbors(
+        get_voronoi_cell(lattice, frac_coords, site_index, cutoff),
+        dist_factor, ang_factor
+    )
+
+
+def _get_factor_limit(values, factor, tol):
+    """
+    Group a list of values into plateaus of values that are within a tolerance
+    of each other, and return the maximum of the last plateau that starts
+    below the factor. This mimics how the DetailedVoronoiContainer determines
+    the distance (and, with negated values, angle) limit of the neighbors.
+
+    """
+    values = np.sort(values)
+
+    limit = None
+    plateau_start = values[0]
+
+    for previous, value in zip(values[:-1], values[1:]):
+        if value - previous > tol:
+            if plateau_start <= factor:
+                limit = previous
+            plateau_start = value
+
+    if plateau_start <= factor:
+        limit = values[-1]
+
+    if limit is None:
+        raise ValueError("Distance or angle parameter not found.")
+
+    return limit
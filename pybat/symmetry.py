@@ -0,0 +1,271 @@
+# coding: utf8
+# Copyright (c) Marnik Bercx, University of Antwerp
+# Distributed under the terms of the MIT License
+
+import numpy as np
+
+from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
+
+from pybat.neighbors import PeriodicSiteIndex, SITE_MATCHING_TOL
+
+"""
+Symmetry analysis of structures, which is performed once and shared by all
+methods that check the equivalence of sites, dimers, etc.
+
+"""
+
+__author__ = "Marnik Bercx"
+__copyright__ = "Copyright 2019, Marnik Bercx, University of Antwerp"
+__version__ = "pre-alpha"
+__maintainer__ = "Marnik Bercx"
+__email__ = "marnik.bercx@uantwerpen.be"
+__date__ = "Apr 2019"
+
+DEFAULT_SYMPREC = 0.01
+DEFAULT_ANGLE_TOLERANCE = 5
+
+
+class SymmetryContext(object):
+    """
+    Result of the symmetry analysis of a structure, i.e. the symmetry
+    operations as stacked arrays of rotations and translations in fractional
+    coordinates and the mapping of the sites onto symmetrically equivalent
+    sites. The magnetic moments of the sites are taken into account, in the
+    same way as for the pymatgen space group operations.
+
+    Only the arrays are pickled. The SpacegroupAnalyzer and spglib dataset are
+    rebuilt when needed, from the structure that is attached to the context.
+
+    """
+
+    def __init__(self, structure, symprec=DEFAULT_SYMPREC,
+                 angle_tolerance=DEFAULT_ANGLE_TOLERANCE):
+        """
+        Analyze the symmetry of a structure.
+
+        Args:
+            structure (pymatgen.core.Structure): Structure to analyze.
+            symprec (float): Distance tolerance for the symmetry analysis.
+            angle_tolerance (float): Angle tolerance for the symmetry analysis.
+
+        """
+        self._symprec = symprec
+        self._angle_tolerance = angle_tolerance
+
+        self._structure = None
+        self._analyzer = None
+        self._dataset = None
+        self._space_group_operations = None
+        self._site_permutations = None
+        self._equivalent_atoms = None
+
+        self.attach(structure)
+
+        self._lattice = structure.lattice
+        self._frac_coords = np.array(structure.frac_coords)
+
+        operations = self.analyzer.get_symmetry_operations(cartesian=False)
+
+        self._rotations = np.array(
+            [np.round(op.rotation_matrix) for op in operations], dtype=int
+        ).reshape(-1, 3, 3)
+        self._translations = np.array(
+            [op.translation_vector for op in operations], dtype=float
+        ).reshape(-1, 3)
+
+        for array in (self._rotations, self._translations):
+            array.flags.writeable = False
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+
+        for attribute in ("_structure", "_analyzer", "_dataset",
+                          "_space_group_operations"):
+            state[attribute] = None
+
+        return state
+
+    def attach(self, structure):
+        """
+        Attach the structure the context was determined for, which is used to
+        rebuild the SpacegroupAnalyzer, e.g. after the context is loaded from
+        the disk cache.
+
+        Args:
+            structure (pymatgen.core.Structure): Structure of the context.
+
+        Returns:
+            None
+
+        """
+        self._structure = structure
+        self._analyzer = None
+        self._dataset = None
+        self._space_group_operations = None
+
+    @property
+    def analyzer(self):
+        """
+        The pymatgen SpacegroupAnalyzer of the structure, e.g. for determining
+        the conventional or primitive standard structure.
+
+        """
+        if self._analyzer is None:
+            if self._structure is None:
+                raise ValueError("No structure is attached to the symmetry "
+                                 "context.")
+
+            self._analyzer = SpacegroupAnalyzer(
+                self._structure, symprec=self._symprec,
+                angle_tolerance=self._angle_tolerance
+            )
+
+        return self._analyzer
+
+    @property
+    def dataset(self):
+        """
+        The spglib symmetry dataset of the structure. Note that spglib does
+        not consider the magnetic moments for the dataset.
+
+        """
+        if self._dataset is None:
+            self._dataset = self.analyzer.get_symmetry_dataset()
+
+        return self._dataset
+
+    @property
+    def rotations(self):
+        """
+        (K, 3, 3) array of the rotation matrices of the symmetry operations, in
+        fractional coordinates.
+
+        """
+        return self._rotations
+
+    @property
+    def translations(self):
+        """
+        (K, 3) array of the translation vectors of the symmetry operations, in
+        fractional coordinates.
+
+        """
+        return self._translations
+
+    @property
+    def equivalent_atoms(self):
+        """
+        Array which maps every site onto the index of the symmetrically
+        equivalent site that represents its orbit, i.e. the site with the
+        lowest index in the orbit.
+
+        """
+        if self._equivalent_atoms is None:
+            equivalent_atoms = self.site_permutations.min(axis=0)
+            equivalent_atoms.flags.writeable = False
+            self._equivalent_atoms = equivalent_atoms
+
+        return self._equivalent_atoms
+
+    @property
+    def space_group_operations(self):
+        """
+        The symmetry operations as a pymatgen SpacegroupOperations instance.
+
+        """
+        if self._space_group_operations is None:
+            self._space_group_operations = \
+                self.analyzer.get_space_group_operations()
+
+        return self._space_group_operations
+
+    @property
+    def site_permutations(self):
+        """
+        (K, N) array of the site permutations of the symmetry operations, i.e.
+        element [k, i] is the index of the site onto which site i is mapped by
+        symmetry operation k.
+
+        """
+        if self._site_permutations is None:
+            self._site_permutations = self._find_site_permutations()
+
+        return self._site_permutations
+
+    def __len__(self):
+        return len(self._rotations)
+
+    def transform_coords(self, frac_coords):
+        """
+        Apply all symmetry operations to a set of fractional coordinates.
+
+        Args:
+            frac_coords (numpy.ndarray): (N, 3) array of fractional coordinates.
+
+        Returns:
+            (numpy.ndarray): (K, N, 3) array with the coordinates transformed by
+                each of the K symmetry operations.
+
+        """
+        frac_coords = np.array(frac_coords, dtype=float).reshape(-1, 3)
+
+        return np.einsum("kij,nj->kni", self._rotations, frac_coords) \
+            + self._translations[:, np.newaxis, :]
+
+    def get_orbit_keys(self, index_tuples):
+        """
+        Determine a canonical key for the orbit of each tuple of site indices,
+        e.g. the index pairs of dimers. Two tuples of sites are symmetrically
+        equivalent if and only if they have the same orbit key. The order of
+        the sites within each tuple is not considered.
+
+        Args:
+            index_tuples (numpy.ndarray): (M, n) array of site indices.
+
+        Returns:
+            (numpy.ndarray): (M,) array of orbit keys.
+
+        """
+        index_tuples = np.array(index_tuples, dtype=int)
+        index_tuples = index_tuples.reshape(len(index_tuples), -1)
+
+        if len(index_tuples) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        permutations = self.site_permutations
+        number_of_sites = permutations.shape[1]
+
+        # Apply all symmetry operations to all tuples at once, ignoring the
+        # order of the sites in each tuple, and encode the transformed tuples
+        # as integers.
+        images = np.sort(permutations[:, index_tuples], axis=2)
+
+        codes = np.zeros(images.shape[:2], dtype=np.int64)
+        for column in range(images.shape[2]):
+            codes = codes * number_of_sites + images[:, :, column]
+
+        return codes.min(axis=0)
+
+    def _find_site_permutations(self):
+        site_index = PeriodicSiteIndex(self._lattice, self._frac_coords,
+                                       tol=SITE_MATCHING_TOL)
+        number_of_sites = len(self._frac_coords)
+
+        transformed_coords = self.transform_coords(self._frac_coords)
+
+        (point_indices, site_indices) = site_index.query(
+            transformed_coords.reshape(-1, 3)
+        )
+
+        permutations = np.full(len(self) * number_of_sites, -1, dtype=int)
+        permutations[point_indices] = site_indices
+        permutations = permutations.reshape(len(self), number_of_sites)
+
+        if np.any(permutations == -1):
+            raise ValueError("Could not map all sites onto each other with the "
+                             "symmetry operations. Consider increasing the "
+                             "site matching tolerance.")
+
+        permutations.flags.writeable = False
+
+        return permutations
@@ -4,12 +4,11 @@
 
 import os
 import ast
-import numpy as np
 
 from pybat.workflow.firetasks import VaspTask, CustodianTask
 from pybat.workflow.fireworks import ScfFirework, RelaxFirework, NebFirework
 
-from pybat.core import Cathode, LiRichCathode, Dimer
+from pybat.core import Cathode, LiRichCathode
 from pybat.cli.commands.define import define_dimer, define_migration
 from pybat.cli.commands.setup import transition
 
@@ -410,7 +409,8 @@ def neb_workflow(directory, nimages=7, functional=("pbe", {}), is_metal=False,
 def configuration_workflow(structure_file, substitution_sites=None, element_list=None,
                            sizes=None, concentration_restrictions=None,
                            max_configurations=None, functional=("pbe", {}),
-                           directory=None, in_custodian=False, number_nodes=None):
+                           directory=None, in_custodian=False, number_nodes=None,
+                           processes=None, checkpoint_directory=None):
     # Load the cathode from the structure file
     cat = Cathode.from_file(structure_file)
 
@@ -439,14 +439,18 @@ def configuration_workflow(structure_file, substitution_sites=None, element_list
         if max_configurations == 0:
             max_configurations = None
 
-    configurations = cat.get_cation_configurations(
+    # The configurations are written to their directories as they are
+    # enumerated, so they never all have to be kept in memory. In case a
+    # checkpoint directory is provided, a rerun resumes the enumeration.
+    configurations = cat.iter_cation_configurations(
         substitution_sites=substitution_sites,
         cation_list=element_list,
         sizes=sizes,
         concentration_restrictions=concentration_restrictions,
-        max_configurations=max_configurations
+        max_configurations=max_configurations,
+        processes=processes,
+        checkpoint_directory=checkpoint_directory
     )
-    print("Found " + str(len(configurations)) + " configurations.")
 
     if directory == "":
         directory = os.getcwd()
@@ -461,43 +465,19 @@ def configuration_workflow(structure_file, substitution_sites=None, element_list
     # These scripts do not consider the fact that there already may be configuration
     # directories present. This needs to be changed.
 
-    # Because of the directory structure, we need to differentiate between TM
-    # configurations and Li/Vac configurations #TODO
-    if "Vac" in element_list:
-        # Set up Li configuration study
-        for conf_number, configuration in enumerate(configurations):
+    for conf_number, configuration in enumerate(configurations):
+
+        # Because of the directory structure, we need to differentiate between TM
+        # configurations and Li/Vac configurations #TODO
+        if "Vac" in element_list:
+            # Set up Li configuration study
             conf_dir = os.path.join(
                 os.path.abspath(directory), "tm_conf_1",
                 str(round(configuration.concentration, 3)),
                 "workion_conf" + str(conf_number), "prim"
             )
-            if not os.path.exists(conf_dir):
-                os.makedirs(conf_dir)
-            configuration.to("json", os.path.join(conf_dir, "cathode.json"))
-            relax_dir = os.path.join(conf_dir, functional_dir + "_relax")
-            scf_dir = os.path.join(conf_dir, functional_dir + "_scf")
-
-            scf_firework = ScfFirework(
-                structure_file=os.path.join(relax_dir, "final_cathode.json"),
-                functional=functional,
-                directory=scf_dir,
-                write_chgcar=False,
-                in_custodian=in_custodian,
-                number_nodes=number_nodes
-            )
-            fw_action = FWAction(additions=scf_firework)
-
-            firework_list.append(RelaxFirework(
-                structure_file=os.path.join(conf_dir, "cathode.json"),
-                functional=functional,
-                directory=relax_dir,
-                in_custodian=in_custodian,
-                number_nodes=number_nodes,
-                fw_action=fw_action
-            ))
-    else:
-        # Set up TM configuration study
-        for conf_number, configuration in enumerate(configurations):
+        else:
+            # Set up TM configuration study
             try:
                 conf_dir = os.path.join(
                     os.path.abspath(directory), "tm_conf_" + str(conf_number),
@@ -507,30 +487,33 @@ def configuration_workflow(structure_file, substitution_sites=None, element_list
                 conf_dir = os.path.join(
                     os.path.abspath(directory), "tm_conf_" + str(conf_number), "prim"
                 )
-            if not os.path.exists(conf_dir):
-                os.makedirs(conf_dir)
-            configuration.to("json", os.path.join(conf_dir, "cathode.json"))
-            relax_dir = os.path.join(conf_dir, functional_dir + "_relax")
-            scf_dir = os.path.join(conf_dir, functional_dir + "_scf")
-
-            scf_firework = ScfFirework(
-                structure_file=os.path.join(relax_dir, "final_cathode.json"),
-                functional=functional,
-                directory=scf_dir,
-                write_chgcar=False,
-                in_custodian=in_custodian,
-                number_nodes=number_nodes
-            )
-            fw_action = FWAction(additions=scf_firework)
 
-            firework_list.append(RelaxFirework(
-                structure_file=os.path.join(conf_dir, "cathode.json"),
-                functional=functional,
-                directory=relax_dir,
-                in_custodian=in_custodian,
-                number_nodes=number_nodes,
-                fw_action=fw_action
-            ))
+        if not os.path.exists(conf_dir):
+            os.makedirs(conf_dir)
+        configuration.to("json", os.path.join(conf_dir, "cathode.json"))
+        relax_dir = os.path.join(conf_dir, functional_dir + "_relax")
+        scf_dir = os.path.join(conf_dir, functional_dir + "_scf")
+
+        scf_firework = ScfFirework(
+            structure_file=os.path.join(relax_dir, "final_cathode.json"),
+            functional=functional,
+            directory=scf_dir,
+            write_chgcar=False,
+            in_custodian=in_custodian,
+            number_nodes=number_nodes
+        )
+        fw_action = FWAction(additions=scf_firework)
+
+        firework_list.append(RelaxFirework(
+            structure_file=os.path.join(conf_dir, "cathode.json"),
+            functional=functional,
+            directory=relax_dir,
+            in_custodian=in_custodian,
+            number_nodes=number_nodes,
+            fw_action=fw_action
+        ))
+
+    print("Found " + str(len(firework_list)) + " configurations.")
 
     # Set up a clear name for the workflow
     workflow_name = str(cat.composition.reduced_formula).replace(" ", "")
@@ -575,26 +558,14 @@ def noneq_dimers_workflow(structure_file, distance, functional=("pbe", {}),
     """
 
     lirich = LiRichCathode.from_file(structure_file)
-    dimer_lists = lirich.list_noneq_dimers()
-
-    for dimer_list in dimer_lists:
-
-        # Find the dimer closest to the center of the lattice. Just for
-        # visualization purposes.
-        central_dimer = [(), 1e10]
-
-        for dimer in dimer_list:
-
-            dimer_center = Dimer(lirich, dimer).center
-            lattice_center = np.sum(lirich.lattice.matrix, 0) / 3
-
-            dist_to_center = np.linalg.norm(dimer_center - lattice_center)
+    (_, central_dimers) = lirich.list_noneq_dimers(return_central_dimers=True)
 
-            if dist_to_center < central_dimer[1]:
-                central_dimer = [dimer, dist_to_center]
+    # Use the dimer closest to the center of the lattice for each class of
+    # equivalent dimers. Just for visualization purposes.
+    for central_dimer in central_dimers:
 
         dimer_workflow(structure_file=structure_file,
-                       dimer_indices=central_dimer[0],
+                       dimer_indices=central_dimer,
                        distance=distance,
                        functional=functional,
                        is_metal=is_metal,
@@ -11,7 +11,13 @@ setup(
         "fireworks",
         "custodian",
         "tabulate",
-        "icet"
+        "numpy",
+        "scipy",
+        "spglib",
+        "ase",
+        # pybat.enumeration relies on the internals of the icet structure
+        # enumeration
+        "icet==4.0"
     ],
     entry_points='''
         [console_scripts]